@@ -1,15 +1,8 @@
 #!/bin/bash
 set -e
 
-echo "Running migrations..."
-python manage.py makemigrations --noinput
-python manage.py migrate --noinput
-
-echo "Creating admin superuser..."
-python manage.py create_admin
-
-echo "Initializing data..."
-python manage.py initdata
-
-echo "Starting server..."
-exec python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+# The default command is `serve --bootstrap`: it applies migrations only when
+# some are pending, creates the admin user and sample data, then preforks the
+# workers. Any other command (e.g. `runserver` for development) runs as given.
+echo "Starting: $*"
+exec "$@"
@@ -1,11 +1,42 @@
 from django.contrib import admin
-from .models import Item, Order, OrderItem, Tax, Discount
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import Item, Job, Order, OrderItem, StripeEvent, Tax, Discount
+from .order_export import FORMATS, export_database, iter_rows, paid_orders, render
 
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "price_dollars")
-    search_fields = ("name",)
+    list_display = ("id", "sku", "name", "price_dollars")
+    search_fields = ("name", "description", "sku__exact")
+
+
+class TotalRangeFilter(admin.SimpleListFilter):
+    title = "total"
+    parameter_name = "total"
+
+    RANGES = {
+        "lt50": (None, 5000),
+        "50to500": (5000, 50000),
+        "gte500": (50000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ("lt50", "Under $50"),
+            ("50to500", "$50 – $500"),
+            ("gte500", "$500 and over"),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        low, high = self.RANGES[self.value()]
+        if low is not None:
+            queryset = queryset.filter(total__gte=low)
+        if high is not None:
+            queryset = queryset.filter(total__lt=high)
+        return queryset
 
 
 class OrderItemInline(admin.TabularInline):
@@ -17,7 +48,8 @@ class OrderItemInline(admin.TabularInline):
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "created_at", "is_paid", "discount", "tax", "total_dollars")
-    list_filter = ("is_paid", "created_at")
+    list_filter = ("is_paid", "created_at", TotalRangeFilter)
+    list_select_related = ("discount", "tax")
     readonly_fields = ("created_at", "subtotal_dollars", "discount_amount_dollars", "tax_amount_dollars", "total_dollars")
     inlines = [OrderItemInline]
     
@@ -31,6 +63,26 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    actions = ("export_csv", "export_jsonl")
+
+    @admin.display(description="Total", ordering="total")
+    def total_dollars(self, obj: Order) -> float:
+        return obj.total_dollars
+
+    @admin.action(description="Export selected paid orders as CSV")
+    def export_csv(self, request, queryset):
+        return self._export(queryset, "csv")
+
+    @admin.action(description="Export selected paid orders as JSONL")
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, "jsonl")
+
+    def _export(self, queryset, fmt: str) -> StreamingHttpResponse:
+        rows = iter_rows(paid_orders(queryset.using(export_database())))
+        response = StreamingHttpResponse(render(rows, fmt), content_type=FORMATS[fmt])
+        response["Content-Disposition"] = f'attachment; filename="paid-orders.{fmt}"'
+        return response
+
 
 @admin.register(Discount)
 class DiscountAdmin(admin.ModelAdmin):
@@ -43,4 +95,33 @@ class DiscountAdmin(admin.ModelAdmin):
 class TaxAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "percentage", "is_active")
     list_filter = ("is_active",)
-    list_editable = ("is_active",)
\ No newline at end of file
+    list_editable = ("is_active",)
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "event_id", "type", "received_at", "processed_at")
+    list_filter = ("type",)
+    search_fields = ("event_id",)
+    readonly_fields = ("event_id", "type", "payload", "received_at", "processed_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "type", "status", "attempts", "run_at", "locked_by", "finished_at")
+    list_filter = ("status", "type")
+    readonly_fields = ("locked_at", "locked_by", "last_error", "created_at", "finished_at")
+    actions = ("requeue",)
+
+    @admin.action(description="Requeue selected jobs")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f"Requeued {updated} job(s)")
\ No newline at end of file
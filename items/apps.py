@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ItemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'items'
+
+    def ready(self) -> None:
+        from . import signals, tasks  # noqa: F401
+        from .stripe_client import get_stripe_client
+
+        get_stripe_client()
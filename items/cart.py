@@ -0,0 +1,270 @@
+import hashlib
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.sessions.backends import signed_cookies
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from . import page_cache
+from .models import Item, Order, OrderItem, OrderPricing
+
+
+@dataclass(frozen=True)
+class CartLine:
+    item: Item
+    quantity: int
+
+    @property
+    def line_total(self) -> int:
+        return self.item.price * self.quantity
+
+
+def _with_quantity(quantities: dict[str, int], key: str, quantity: int) -> dict[str, int]:
+    if quantity > 0:
+        quantities[key] = quantity
+    else:
+        quantities.pop(key, None)
+    return quantities
+
+
+class CartBusy(Exception):
+    """The session's cart lock was not free within ``CART_LOCK_TIMEOUT``."""
+
+
+@contextmanager
+def _session_lock(session_key: str):
+    """Per-session lock held in the default cache, which every worker shares and adds to atomically."""
+    lock_key = f"cart-lock:{session_key}"
+    # The same timeout expires the lock if its holder dies mid-update, so a
+    # lock left behind is free again by the time a waiter gives up.
+    deadline = time.monotonic() + settings.CART_LOCK_TIMEOUT
+    while not cache.add(lock_key, 1, timeout=settings.CART_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise CartBusy("The cart is being changed by another request")
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+class SessionCart:
+    """
+    Item → quantity map kept in the session.
+
+    Reading and changing the cart never touches the ``Order``/``OrderItem``
+    tables; ``to_order`` writes a real order only when checkout starts.
+    """
+
+    SESSION_KEY = "cart"
+    ORDER_KEY = "cart_order"
+    LEGACY_ORDER_KEY = "order_id"
+
+    def __init__(self, session: SessionBase):
+        self.session = session
+        if self.LEGACY_ORDER_KEY in session:
+            self._import_legacy_order()
+
+    @property
+    def quantities(self) -> dict[str, int]:
+        return self.session.get(self.SESSION_KEY, {})
+
+    def __len__(self) -> int:
+        return len(self.quantities)
+
+    def __contains__(self, item_id: int) -> bool:
+        return str(item_id) in self.quantities
+
+    def quantity(self, item_id: int) -> int:
+        return self.quantities.get(str(item_id), 0)
+
+    def add(self, item_id: int, quantity: int = 1) -> int:
+        """Add ``quantity`` of ``item_id`` to whatever is in the cart; return the new quantity."""
+        return self.increment(item_id, quantity)
+
+    def increment(self, item_id: int, by: int) -> int:
+        """Shift the quantity by ``by``, dropping the line at zero; return the new quantity."""
+        key = str(item_id)
+
+        def change(quantities: dict[str, int]) -> dict[str, int]:
+            return _with_quantity(quantities, key, quantities.get(key, 0) + by)
+
+        return self._modify(change).get(key, 0)
+
+    def set(self, item_id: int, quantity: int) -> None:
+        self._modify(lambda quantities: _with_quantity(quantities, str(item_id), quantity))
+
+    def remove(self, item_id: int) -> bool:
+        if item_id not in self:
+            return False
+        self.set(item_id, 0)
+        return True
+
+    def apply(self, operations: list[dict]) -> None:
+        """
+        Apply ``set``/``increment``/``remove`` operations all-or-nothing.
+
+        Raises ``ValueError`` naming the first bad operation, leaving the cart
+        untouched. Items are checked with one ``in_bulk`` that also fills
+        ``lines``; only the operations' items must exist, lines of items since
+        deleted from the catalog are dropped, as ``lines`` already hides them.
+        """
+        items = {}
+
+        def change(quantities: dict[str, int]) -> dict[str, int]:
+            referenced = set()
+            for index, operation in enumerate(operations):
+                try:
+                    op = operation["op"]
+                    key = str(int(operation["item_id"]))
+                    if op == "set":
+                        quantity = int(operation["quantity"])
+                    elif op == "increment":
+                        quantity = quantities.get(key, 0) + int(operation.get("by", 1))
+                    elif op == "remove":
+                        quantity = 0
+                    else:
+                        raise ValueError(f"unknown op {op!r}")
+                except (KeyError, TypeError, ValueError) as e:
+                    raise ValueError(f"operation {index}: {e}") from e
+                referenced.add(key)
+                quantities = _with_quantity(quantities, key, quantity)
+
+            items.update(Item.objects.in_bulk([int(item_id) for item_id in quantities]))
+            missing = [item_id for item_id in quantities if int(item_id) not in items]
+            unknown = [item_id for item_id in missing if item_id in referenced]
+            if unknown:
+                raise ValueError(f"unknown item(s): {', '.join(unknown)}")
+            for item_id in missing:
+                del quantities[item_id]
+            return quantities
+
+        quantities = self._modify(change)
+        self.lines = [CartLine(items[int(item_id)], quantity) for item_id, quantity in quantities.items()]
+
+    def clear(self) -> None:
+        self._store({})
+
+    def _store(self, quantities: dict[str, int]) -> None:
+        self.session[self.SESSION_KEY] = quantities
+        self.__dict__.pop("lines", None)
+
+    def _modify(self, change: Callable[[dict[str, int]], dict[str, int]]) -> dict[str, int]:
+        """
+        Apply ``change`` to the cart as currently stored and write it back.
+
+        Concurrent requests of one session would otherwise each save the whole
+        session they loaded and the last one would drop the others' changes.
+        Here the read-modify-write of the stored cart runs under a short
+        per-session lock shared by all workers, so relative changes
+        (``increment``) never get lost.
+        """
+        session_key = self.session.session_key
+        if session_key is None or isinstance(self.session, signed_cookies.SessionStore):
+            # Nothing stored server-side to re-read; the response carries the cart.
+            quantities = change(dict(self.quantities))
+            self._store(quantities)
+            return quantities
+
+        with _session_lock(session_key):
+            stored = type(self.session)(session_key)
+            current = stored.get(self.SESSION_KEY)
+            if stored.session_key != session_key:
+                # The session is gone from the store; the middleware will save a new one.
+                quantities = change(dict(self.quantities))
+                self._store(quantities)
+                return quantities
+            quantities = change(dict(current or {}))
+            if quantities != current:
+                stored[self.SESSION_KEY] = quantities
+                stored.save()
+
+        modified = self.session.modified
+        self._store(quantities)
+        # Already written above; re-saving the request's copy later could undo a newer change.
+        self.session.modified = modified
+        return quantities
+
+    @cached_property
+    def lines(self) -> list[CartLine]:
+        items = Item.objects.in_bulk([int(item_id) for item_id in self.quantities])
+        return [
+            CartLine(items[int(item_id)], quantity)
+            for item_id, quantity in self.quantities.items()
+            if int(item_id) in items
+        ]
+
+    def etag(self) -> str:
+        """
+        Validator for the rendered cart.
+
+        It changes with the cart contents, whenever one of its items is edited
+        or deleted, and with a deploy that changes the cart template or its
+        assets; only ``lines`` is loaded, nothing is rendered or priced.
+        """
+        state = [
+            page_cache.page_version(),
+            sorted(self.quantities.items()),
+            [(line.item.id, line.item.updated_at.isoformat()) for line in self.lines],
+        ]
+        return hashlib.sha256(json.dumps(state).encode()).hexdigest()[:32]
+
+    def as_order(self) -> Order:
+        """Unsaved order carrying the cart's totals, for display."""
+        order = Order(subtotal=sum(line.line_total for line in self.lines))
+        order.apply_totals()
+        return order
+
+    def to_order(self) -> Order:
+        """
+        Materialize the cart as an ``Order`` with one ``bulk_create`` of its lines.
+
+        A repeated checkout of an unchanged cart reuses the order created last time.
+        """
+        checkout = self.session.get(self.ORDER_KEY)
+        if checkout and checkout["cart"] == self.quantities:
+            order = Order.objects.select_related("discount", "tax").filter(id=checkout["id"], is_paid=False).first()
+            if order is not None:
+                return order
+
+        order = self.as_order()
+        with transaction.atomic():
+            order.save()
+            # bulk_create skips the per-line signals; the subtotal is already set above.
+            lines = OrderItem.objects.bulk_create(
+                OrderItem(order=order, item=line.item, quantity=line.quantity) for line in self.lines
+            )
+        order.pricing = OrderPricing.from_lines(order, lines)
+        self.session[self.ORDER_KEY] = {"id": order.id, "cart": self.quantities}
+        return order
+
+    def finish_checkout(self, order_id: int) -> None:
+        """
+        Forget the checkout of ``order_id`` once the customer is back from paying for it.
+
+        The cart is emptied too, unless it was changed after that checkout started.
+        """
+        checkout = self.session.get(self.ORDER_KEY)
+        if not checkout or checkout["id"] != order_id:
+            return
+        del self.session[self.ORDER_KEY]
+        if checkout["cart"] == self.quantities:
+            self.clear()
+
+    def _import_legacy_order(self) -> None:
+        """Carry over a cart stored as an ``Order`` id by earlier versions."""
+        order_id = self.session.pop(self.LEGACY_ORDER_KEY)
+        if self.SESSION_KEY in self.session:
+            return
+        quantities = dict(
+            OrderItem.objects.filter(order_id=order_id, order__is_paid=False).values_list("item_id", "quantity")
+        )
+        self._store({str(item_id): quantity for item_id, quantity in quantities.items()})
+
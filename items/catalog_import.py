@@ -0,0 +1,139 @@
+import csv
+import json
+import os
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, TextIO
+
+from django.db import transaction
+
+from . import page_cache
+from .models import Item, Order, OrderItem, recompute_order_totals
+
+UPDATE_FIELDS = ["name", "description", "price", "updated_at"]
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[dict]:
+    """
+    Yield one dict per CSV row or JSONL line without reading the whole stream.
+
+    A JSONL line that is not a JSON object yields an empty dict, so it is
+    counted as a skipped row and a resumed import gets past it.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield row if isinstance(row, dict) else {}
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}")
+
+
+def row_to_item(row: dict) -> Optional[Item]:
+    """Build an unsaved ``Item`` from an import row, or ``None`` if the row is unusable."""
+    sku = str(row.get("sku") or "").strip()
+    name = str(row.get("name") or "").strip()
+    try:
+        price = int(row.get("price"))
+    except (TypeError, ValueError):
+        return None
+    if not sku or len(sku) > 64 or not name or len(name) > 60 or price < 0:
+        return None
+    return Item(sku=sku, name=name, description=str(row.get("description") or "")[:1000], price=price)
+
+
+def read_checkpoint(path: str) -> int:
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path: str, rows: int) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(str(rows))
+    os.replace(tmp, path)
+
+
+def upsert_items(items: list[Item]) -> tuple[int, int]:
+    """
+    Insert or update ``items`` by SKU in one statement; return ``(created, updated)``.
+
+    ``bulk_create`` skips the ``Item`` signals, so cached pages of the
+    touched items are dropped and unpaid orders holding re-priced items
+    are re-totalled here instead. The pages are dropped from the shared
+    default cache, so the web workers stop serving them too.
+    """
+    by_sku = {item.sku: item for item in items}
+    existing = {sku: (pk, price) for sku, pk, price in Item.objects.filter(sku__in=by_sku).values_list("sku", "id", "price")}
+    Item.objects.bulk_create(by_sku.values(), update_conflicts=True, unique_fields=["sku"], update_fields=UPDATE_FIELDS)
+
+    repriced = [pk for sku, (pk, price) in existing.items() if by_sku[sku].price != price]
+    if repriced:
+        order_ids = OrderItem.objects.filter(item_id__in=repriced).values("order_id")
+        recompute_order_totals(Order.objects.filter(is_paid=False, id__in=order_ids))
+    transaction.on_commit(lambda: [page_cache.invalidate(pk) for pk, _ in existing.values()])
+    return len(by_sku) - len(existing), len(existing)
+
+
+def import_items(
+    rows: Iterable[dict],
+    batch_size: int = 5000,
+    checkpoint: Optional[str] = None,
+    on_batch: Optional[Callable[[ImportResult], None]] = None,
+) -> ImportResult:
+    """
+    Upsert catalog rows keyed on ``sku``, ``batch_size`` rows per transaction.
+
+    With ``checkpoint`` the number of rows already committed is stored in that
+    file after each batch and skipped on the next run, so an interrupted
+    import resumes where it stopped. Upserts are idempotent, so a crash
+    between commit and checkpoint write only repeats one batch.
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+    done = read_checkpoint(checkpoint) if checkpoint else 0
+    rows = iter(rows)
+    if done:
+        next(islice(rows, done, done), None)
+    result.rows = done
+
+    while batch := list(islice(rows, batch_size)):
+        items = [item for item in map(row_to_item, batch) if item is not None]
+        with transaction.atomic():
+            created, updated = upsert_items(items) if items else (0, 0)
+        result.rows += len(batch)
+        result.created += created
+        result.updated += updated
+        result.skipped += len(batch) - len(items)
+        result.batches += 1
+        if checkpoint:
+            write_checkpoint(checkpoint, result.rows)
+        result.elapsed = time.perf_counter() - started
+        if on_batch is not None:
+            on_batch(result)
+
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Stripe events after which a session can no longer be handed out.
+CLOSED_EVENT_TYPES = {"checkout.session.completed", "checkout.session.expired"}
+
+_key_locks: Dict[str, threading.Lock] = {}
+_key_locks_lock = threading.Lock()
+
+
+def checkout_fingerprint(scope: str, session_params: Dict[str, Any]) -> str:
+    """Hash everything the Stripe session is built from: lines, quantities, discount, tax, URLs."""
+    payload = json.dumps([scope, session_params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_timeout(session) -> int:
+    timeout = settings.CHECKOUT_SESSION_CACHE_TIMEOUT
+    expires_at = getattr(session, "expires_at", None)
+    if expires_at:
+        # Stop handing the session out a little before Stripe expires it.
+        timeout = min(timeout, int(expires_at - time.time()) - settings.CHECKOUT_SESSION_EXPIRY_MARGIN)
+    return timeout
+
+
+class CheckoutSessionBusy(Exception):
+    """Another worker is still creating the session and did not finish within the lock timeout."""
+
+
+def get_or_create_checkout_session(fingerprint: str, create: Callable[[], Any]) -> str:
+    """
+    Return the id of an open checkout session for ``fingerprint``, calling ``create`` at most once.
+
+    Identical requests in this process wait on a per-key lock; other workers
+    see the lock in the shared default cache and poll for the session id
+    instead of calling Stripe. A worker that gets neither the id nor the lock
+    within ``CHECKOUT_SESSION_LOCK_TIMEOUT`` raises ``CheckoutSessionBusy``
+    rather than create a second session. The id is handed out until Stripe
+    reports the session completed or expired (``forget_checkout_session``).
+    """
+    key = f"checkout-session:{fingerprint}"
+    session_id = cache.get(key)
+    if session_id:
+        return session_id
+
+    with _key_locks_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    try:
+        with key_lock:
+            lock_key = f"{key}:lock"
+            lock_timeout = settings.CHECKOUT_SESSION_LOCK_TIMEOUT
+            deadline = time.monotonic() + lock_timeout
+            while not cache.add(lock_key, 1, timeout=lock_timeout):
+                session_id = cache.get(key)
+                if session_id:
+                    return session_id
+                if time.monotonic() >= deadline:
+                    raise CheckoutSessionBusy("A checkout session for this cart is still being created")
+                time.sleep(0.05)
+
+            try:
+                # The previous holder may have stored the id just before releasing the lock.
+                session_id = cache.get(key)
+                if session_id:
+                    return session_id
+                session = create()
+                timeout = _cache_timeout(session)
+                if timeout > 0:
+                    cache.set_many({key: session.id, _owner_key(session.id): key}, timeout=timeout)
+                return session.id
+            finally:
+                cache.delete(lock_key)
+    finally:
+        with _key_locks_lock:
+            if not key_lock.locked():
+                _key_locks.pop(key, None)
+
+
+def _owner_key(session_id: str) -> str:
+    return f"checkout-session-owner:{session_id}"
+
+
+def forget_checkout_session(session_id: str) -> None:
+    """Stop reusing ``session_id``, e.g. once the customer has paid through it."""
+    owner_key = _owner_key(session_id)
+    key = cache.get(owner_key)
+    cache.delete_many([owner_key, key] if key else [owner_key])
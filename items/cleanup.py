@@ -0,0 +1,104 @@
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem
+from .signals import repricing_suspended
+
+
+@dataclass
+class PurgeResult:
+    orders: int = 0
+    order_items: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    estimated_bytes: Optional[int] = None
+    dry_run: bool = False
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.orders + self.order_items) / self.elapsed if self.elapsed else 0.0
+
+
+def stale_orders(max_age: timedelta):
+    return Order.objects.filter(is_paid=False, created_at__lt=timezone.now() - max_age)
+
+
+def estimate_row_bytes(model) -> Optional[float]:
+    """Average on-disk bytes per row from Postgres statistics; ``None`` elsewhere."""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_total_relation_size(c.oid), c.reltuples FROM pg_class c WHERE c.oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if not row or not row[1] or row[1] <= 0:
+        return None
+    return row[0] / row[1]
+
+
+def purge_stale_orders(
+    max_age: timedelta,
+    batch_size: int = 1000,
+    pause: float = 0.1,
+    dry_run: bool = False,
+    on_batch: Optional[Callable[[PurgeResult], None]] = None,
+) -> PurgeResult:
+    """
+    Delete unpaid orders older than ``max_age`` and their lines, ``batch_size`` ids at a time.
+
+    Each batch is its own short transaction: candidate ids are re-checked
+    under ``SKIP LOCKED`` so orders being paid concurrently are left alone,
+    then their lines and the orders are deleted with re-pricing suspended.
+    Sleeping ``pause`` seconds between batches lets replication and vacuum
+    keep up.
+    """
+    result = PurgeResult(dry_run=dry_run)
+    started = time.perf_counter()
+    orders = stale_orders(max_age)
+
+    if dry_run:
+        result.orders = orders.count()
+        result.order_items = OrderItem.objects.filter(order__in=orders).count()
+        order_bytes = estimate_row_bytes(Order)
+        item_bytes = estimate_row_bytes(OrderItem)
+        if order_bytes is not None and item_bytes is not None:
+            result.estimated_bytes = int(result.orders * order_bytes + result.order_items * item_bytes)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    last_id = 0
+    while True:
+        candidates = list(orders.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+        if not candidates:
+            break
+        last_id = candidates[-1]
+
+        with transaction.atomic():
+            ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(id__in=candidates, is_paid=False)
+                .values_list("id", flat=True)
+            )
+            # Re-pricing every order that is about to disappear would be wasted work.
+            with repricing_suspended():
+                result.order_items += OrderItem.objects.filter(order_id__in=ids).delete()[0]
+                result.orders += Order.objects.filter(id__in=ids).delete()[0]
+
+        result.batches += 1
+        result.elapsed = time.perf_counter() - started
+        if on_batch is not None:
+            on_batch(result)
+        if len(candidates) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    result.elapsed = time.perf_counter() - started
+    return result
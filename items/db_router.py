@@ -0,0 +1,121 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest, HttpResponse
+
+REPLICA = "replica"
+PIN_COOKIE = "db_primary_until"
+
+# Alias reads go to in this context; None (the default, e.g. in commands and
+# background jobs) reads from the primary.
+_reads_from: ContextVar[Optional[str]] = ContextVar("reads_from", default=None)
+_wrote: ContextVar[bool] = ContextVar("wrote", default=False)
+
+
+def replica_configured() -> bool:
+    return REPLICA in connections.settings
+
+
+@contextmanager
+def replica_reads():
+    """Send reads in this block to the replica, e.g. for reports that tolerate lag."""
+    token = _reads_from.set(REPLICA if replica_configured() else None)
+    try:
+        yield
+    finally:
+        _reads_from.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica only where ``replica_reads`` or ``ReplicaRouterMiddleware``
+    allowed it; all writes, and every read after a write, go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _reads_from.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        _reads_from.set(None)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+
+class ReplicaRouterMiddleware:
+    """
+    Route reads of safe requests to the replica, unless the client wrote recently.
+
+    A request that writes sets a cookie pinning the client's reads to the
+    primary for ``DB_REPLICA_STICKY_SECONDS``, so the next page already shows
+    the change even while the replica lags behind.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self._route(request)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            self._reset(tokens)
+        return self._pin(response, wrote)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        # The tokens are set in the request's context: async views see them
+        # directly, and sync_to_async copies them in and back out again.
+        tokens = self._route(request)
+        try:
+            response = await self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            self._reset(tokens)
+        return self._pin(response, wrote)
+
+    def _route(self, request: HttpRequest):
+        use_replica = (
+            replica_configured()
+            and request.method in ("GET", "HEAD", "OPTIONS")
+            and not self._pinned(request)
+        )
+        return _reads_from.set(REPLICA if use_replica else None), _wrote.set(False)
+
+    @staticmethod
+    def _reset(tokens) -> None:
+        reads_token, wrote_token = tokens
+        _reads_from.reset(reads_token)
+        _wrote.reset(wrote_token)
+
+    @staticmethod
+    def _pin(response: HttpResponse, wrote: bool) -> HttpResponse:
+        if wrote and replica_configured():
+            window = settings.DB_REPLICA_STICKY_SECONDS
+            response.set_cookie(PIN_COOKIE, str(int(time.time() + window)), max_age=window, httponly=True, samesite="Lax")
+        return response
+
+    @staticmethod
+    def _pinned(request: HttpRequest) -> bool:
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
@@ -0,0 +1,193 @@
+import logging
+import random
+import threading
+import traceback
+import zlib
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# First key of the advisory locks that serialize claims of concurrency-limited job types.
+ADVISORY_LOCK_CLASS = 0x4A4F4253
+
+
+@dataclass(frozen=True)
+class JobType:
+    name: str
+    handler: Callable[..., Any]
+    concurrency: Optional[int] = None
+    max_attempts: int = 5
+
+
+registry: Dict[str, JobType] = {}
+
+
+def job(name: str, concurrency: Optional[int] = None, max_attempts: int = 5):
+    """Register the decorated function as the handler for jobs of type ``name``."""
+    def decorator(handler: Callable[..., Any]) -> Callable[..., Any]:
+        registry[name] = JobType(name, handler, concurrency, max_attempts)
+        return handler
+    return decorator
+
+
+def enqueue(name: str, payload: Optional[Dict[str, Any]] = None, delay: float = 0) -> Job:
+    job_type = registry[name]
+    return Job.objects.create(
+        type=name,
+        payload=payload or {},
+        max_attempts=job_type.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_unique(name: str, payload: Optional[Dict[str, Any]] = None) -> Optional[Job]:
+    """Enqueue unless an identical job is already waiting to run."""
+    if Job.objects.filter(type=name, payload=payload or {}, status=Job.PENDING).exists():
+        return None
+    return enqueue(name, payload)
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+
+
+def _running(**filters):
+    return Job.objects.filter(status=Job.RUNNING, locked_at__gte=_stale_before(), **filters)
+
+
+def _claimable(types: Optional[Iterable[str]], exclude: Iterable[str] = ()):
+    now = timezone.now()
+    stale = _stale_before()
+    jobs = Job.objects.filter(
+        Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+    )
+    if types is not None:
+        jobs = jobs.filter(type__in=list(types))
+
+    # A first cut only: the counts are re-checked under a lock when claiming.
+    limited = {name: t.concurrency for name, t in registry.items() if t.concurrency}
+    full = set(exclude)
+    if limited:
+        running = dict(_running(type__in=limited).values_list("type").annotate(n=Count("id")))
+        full.update(name for name, limit in limited.items() if running.get(name, 0) >= limit)
+    if full:
+        jobs = jobs.exclude(type__in=full)
+    return jobs.order_by("run_at", "id")
+
+
+def _at_limit(name: str) -> bool:
+    """
+    Whether ``name`` already runs as many jobs as it may, counted inside the claiming transaction.
+
+    On PostgreSQL a transaction-level advisory lock per type makes claims of
+    limited types take turns, so two workers cannot both see the last free slot.
+    """
+    job_type = registry.get(name)
+    if job_type is None or not job_type.concurrency:
+        return False
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            key = zlib.crc32(name.encode()) - 2**31
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [ADVISORY_LOCK_CLASS, key])
+    return _running(type=name).count() >= job_type.concurrency
+
+
+def claim(worker_id: str, types: Optional[Iterable[str]] = None) -> Optional[Job]:
+    """
+    Atomically take the next runnable job for ``worker_id``.
+
+    Uses ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it;
+    elsewhere (SQLite) a compare-and-set UPDATE on the status decides the winner.
+    Per-type concurrency limits are re-checked as part of the claim itself:
+    under the type's lock with row locking, and inside the single UPDATE
+    statement (which SQLite runs alone) otherwise.
+    """
+    claimed = dict(status=Job.RUNNING, locked_at=timezone.now(), locked_by=worker_id, attempts=F("attempts") + 1)
+
+    if connection.features.has_select_for_update_skip_locked:
+        full = set()
+        while True:
+            with transaction.atomic():
+                job = _claimable(types, exclude=full).select_for_update(skip_locked=True).first()
+                if job is None:
+                    return None
+                if not _at_limit(job.type):
+                    Job.objects.filter(id=job.id).update(**claimed)
+                    break
+            full.add(job.type)
+    else:
+        for job in _claimable(types)[:10]:
+            candidate = Job.objects.filter(id=job.id, status=job.status, locked_at=job.locked_at)
+            limit = registry[job.type].concurrency if job.type in registry else None
+            if limit:
+                running = _running(type=OuterRef("type")).order_by().values("type").annotate(n=Count("id")).values("n")
+                candidate = candidate.alias(running=Coalesce(Subquery(running), 0)).filter(running__lt=limit)
+            if candidate.update(**claimed):
+                break
+        else:
+            return None
+
+    job.refresh_from_db()
+    return job
+
+
+def retry_delay(attempts: int) -> float:
+    delay = min(settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def run_job(job: Job) -> None:
+    job_type = registry.get(job.type)
+    try:
+        if job_type is None:
+            raise LookupError(f"No handler registered for job type {job.type!r}")
+        job_type.handler(**job.payload)
+    except Exception:
+        logger.exception("Job %s failed", job)
+        job.last_error = traceback.format_exc()
+        job.locked_at = None
+        job.locked_by = ""
+        if job.attempts >= job.max_attempts:
+            job.status = Job.DEAD
+            job.finished_at = timezone.now()
+        else:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        job.locked_at = None
+    job.save(update_fields=["status", "run_at", "locked_at", "locked_by", "last_error", "finished_at"])
+
+
+def run_pending(worker_id: str = "inline", types: Optional[Iterable[str]] = None) -> int:
+    """Run jobs until none are runnable; return how many ran."""
+    count = 0
+    while (job := claim(worker_id, types)) is not None:
+        run_job(job)
+        count += 1
+    return count
+
+
+def work(worker_id: str, stop: threading.Event, types: Optional[Iterable[str]] = None) -> None:
+    """Worker loop: claim and run jobs, sleeping when idle, until ``stop`` is set."""
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            job = claim(worker_id, types)
+            if job is None:
+                stop.wait(settings.JOB_POLL_INTERVAL)
+                continue
+            run_job(job)
+    finally:
+        connection.close()
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+
+class Command(BaseCommand):
+    help = "Compare sync and async checkout capacity per worker against a local Stripe stand-in."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Checkouts per mode.")
+        parser.add_argument("--threads", type=int, default=4, help="Threads per sync worker.")
+        parser.add_argument("--concurrency", type=int, default=100, help="In-flight checkouts for the async worker.")
+        parser.add_argument("--latency", type=float, default=200, help="Stand-in Stripe latency in milliseconds.")
+        parser.add_argument("--mode", choices=("sync", "async", "both"), default="both")
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        from items import views
+        from items.models import Item
+        from items.stripe_client import StripeClient, set_stripe_client
+        from items.stripe_standin import StripeStandIn
+
+        item = Item.objects.create(name="Benchmark item", price=1000)
+        factory = RequestFactory()
+        try:
+            with StripeStandIn(latency=options["latency"] / 1000) as standin, \
+                    override_settings(STRIPE_API_BASE=standin.url, STRIPE_SECRET_KEY="sk_test_bench"):
+                previous = set_stripe_client(StripeClient(
+                    api_key="sk_test_bench",
+                    api_base=standin.url,
+                    connect_timeout=settings.STRIPE_CONNECT_TIMEOUT,
+                    read_timeout=settings.STRIPE_READ_TIMEOUT,
+                    max_retries=0,
+                    pool_size=options["threads"],
+                ))
+                try:
+                    if options["mode"] in ("sync", "both"):
+                        self._report("sync", standin, lambda: self._run_sync(views, factory, item, options))
+                    if options["mode"] in ("async", "both"):
+                        self._report("async", standin, lambda: asyncio.run(self._run_async(views, factory, item, options)))
+                finally:
+                    set_stripe_client(previous)
+        finally:
+            item.delete()
+
+    def _report(self, mode, standin, run):
+        standin.peak_in_flight = 0
+        started = time.perf_counter()
+        errors = run()
+        elapsed = time.perf_counter() - started
+        count = self._requests
+        self.stdout.write(
+            f"{mode:>5}: {count} checkouts in {elapsed:.2f}s "
+            f"({count / elapsed:.1f}/s), peak in-flight {standin.peak_in_flight}, errors {errors}"
+        )
+
+    def _run_sync(self, views, factory, item, options):
+        self._requests = options["requests"]
+
+        def checkout(_):
+            return views.buy_item(factory.post(f"/buy/{item.id}/"), item.id).status_code
+
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            statuses = list(pool.map(checkout, range(self._requests)))
+        return sum(status != 200 for status in statuses)
+
+    async def _run_async(self, views, factory, item, options):
+        self._requests = options["requests"]
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def checkout():
+            async with semaphore:
+                response = await views.buy_item_async(factory.post(f"/async/buy/{item.id}/"), item.id)
+                return response.status_code
+
+        statuses = await asyncio.gather(*(checkout() for _ in range(self._requests)))
+        return sum(status != 200 for status in statuses)
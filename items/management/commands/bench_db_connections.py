@@ -0,0 +1,113 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+
+MODES = ("none", "persistent", "pool")
+POOL_ENGINE = "stripe_app.postgresql_pool"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database connection overhead: a new connection per request, "
+        "persistent connections (CONN_MAX_AGE) and the client-side pool (PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Simulated requests per mode.")
+        parser.add_argument("--threads", type=int, default=4, help="Concurrent request threads.")
+        parser.add_argument("--queries", type=int, default=1, help="Queries per request.")
+        parser.add_argument("--mode", action="append", choices=MODES, help="Run only these (repeatable).")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        base = connections[options["database"]].settings_dict
+        modes = options["mode"] or [m for m in MODES if m != "pool" or "postgresql" in base["ENGINE"]]
+        if "pool" in modes and "postgresql" not in base["ENGINE"]:
+            raise CommandError("The pool mode needs a PostgreSQL database.")
+        self.results = {}
+        for mode in modes:
+            self.results[mode] = self._run(mode, base, options)
+            self._print(mode, self.results[mode])
+
+    def _settings(self, mode, base):
+        settings_dict = {**base, "CONN_MAX_AGE": 0 if mode == "none" else 600}
+        if mode == "pool":
+            settings_dict.update(ENGINE=POOL_ENGINE, CONN_MAX_AGE=0, POOL=base.get("POOL", {}))
+        return settings_dict
+
+    def _run(self, mode, base, options):
+        from stripe_app.postgresql_pool.pool import _pools, close_pools
+
+        settings_dict = self._settings(mode, base)
+        wrapper_class = load_backend(settings_dict["ENGINE"]).DatabaseWrapper
+        alias = options["database"]
+        latencies, connects = [], 0
+        pool = _pools.get(alias)
+        pool_opened = pool.opened if pool else 0
+        lock = threading.Lock()
+        per_thread = [
+            options["requests"] // options["threads"] + (i < options["requests"] % options["threads"])
+            for i in range(options["threads"])
+        ]
+
+        def drive(index):
+            nonlocal connects
+            wrapper = wrapper_class(settings_dict, alias)
+            opened = 0
+
+            def count(sender, connection, **kwargs):
+                nonlocal opened
+                opened += connection is wrapper
+
+            # Only this thread sees the replacement wrapper.
+            connections[alias] = wrapper
+            connection_created.connect(count, weak=False)
+            try:
+                for _ in range(per_thread[index]):
+                    started = time.perf_counter()
+                    request_started.send(sender=self.__class__)
+                    for _ in range(options["queries"]):
+                        with wrapper.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                    request_finished.send(sender=self.__class__)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+            finally:
+                connection_created.disconnect(count)
+                wrapper.close()
+                with lock:
+                    connects += opened
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            list(executor.map(drive, range(options["threads"])))
+        elapsed = time.perf_counter() - started
+        if mode == "pool":
+            # Every checkout runs connect(); count the sockets the pool opened instead.
+            connects = _pools[alias].opened - pool_opened
+            close_pools()
+
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+        return {
+            "requests": len(latencies),
+            "connects": connects,
+            "seconds": round(elapsed, 4),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+            "p50_ms": round(percentiles[49] * 1000, 3) if latencies else 0.0,
+            "p95_ms": round(percentiles[94] * 1000, 3) if latencies else 0.0,
+        }
+
+    def _print(self, mode, result):
+        self.stdout.write(
+            f"{mode:>10}: {result['requests']} req in {result['seconds']:.2f}s, "
+            f"mean {result['mean_ms']:.2f}ms p50 {result['p50_ms']:.2f}ms p95 {result['p95_ms']:.2f}ms, "
+            f"{result['connects']} connects"
+        )
@@ -0,0 +1,196 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+
+SCENARIOS = ("item_page", "add_to_cart", "cart_page", "change_quantity", "buy_order")
+SKU_PREFIX = "bench-"
+
+
+class Command(BaseCommand):
+    help = "Load-test the storefront against a seeded dataset and a local fake Stripe; write results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=200)
+        parser.add_argument("--orders", type=int, default=100)
+        parser.add_argument("--lines", type=int, default=3, help="Lines per seeded order.")
+        parser.add_argument("--clients", type=int, default=8, help="Concurrent clients, each with its own session.")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+        parser.add_argument("--latency", type=float, default=50, help="Fake Stripe latency in milliseconds.")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake Stripe calls that fail.")
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Run only these (repeatable).")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark.json", help="JSON results file, '-' for stdout only.")
+        parser.add_argument("--keep-data", action="store_true", help="Leave the seeded rows in the database.")
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        from items.stripe_client import StripeClient, set_stripe_client
+        from items.stripe_standin import StripeStandIn
+
+        self.random = random.Random(options["seed"])
+        item_ids, order_ids = self._seed(options)
+        results = {}
+        try:
+            with StripeStandIn(latency=options["latency"] / 1000, error_rate=options["error_rate"]) as standin, \
+                    override_settings(
+                        STRIPE_API_BASE=standin.url,
+                        STRIPE_SECRET_KEY="sk_test_bench",
+                        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                    ):
+                previous = set_stripe_client(StripeClient(
+                    api_key="sk_test_bench",
+                    api_base=standin.url,
+                    connect_timeout=settings.STRIPE_CONNECT_TIMEOUT,
+                    read_timeout=settings.STRIPE_READ_TIMEOUT,
+                    max_retries=settings.STRIPE_MAX_RETRIES,
+                    pool_size=options["clients"],
+                ))
+                try:
+                    clients = [(Client(), []) for _ in range(options["clients"])]
+                    for scenario in options["scenario"] or SCENARIOS:
+                        results[scenario] = self._run(scenario, clients, item_ids, order_ids, options)
+                        self._print(scenario, results[scenario])
+                    results["stripe"] = {"requests": standin.requests, "errors": standin.errors}
+                finally:
+                    set_stripe_client(previous)
+        finally:
+            if not options["keep_data"]:
+                self._cleanup(item_ids, order_ids)
+
+        report = {
+            "commit": self._commit(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "database": connection.vendor,
+            "parameters": {k: options[k] for k in (
+                "items", "orders", "lines", "clients", "requests", "latency", "error_rate", "seed"
+            )},
+            "results": results,
+        }
+        if options["output"] == "-":
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _seed(self, options):
+        from items.models import Item, Order, OrderItem
+
+        items = Item.objects.bulk_create(
+            Item(sku=f"{SKU_PREFIX}{i}", name=f"Benchmark item {i}", description="Benchmark", price=self.random.randint(100, 100000))
+            for i in range(options["items"])
+        )
+        orders = Order.objects.bulk_create(Order() for _ in range(options["orders"]))
+        lines = []
+        for order in orders:
+            for item in self.random.sample(items, min(options["lines"], len(items))):
+                lines.append(OrderItem(order=order, item=item, quantity=self.random.randint(1, 3)))
+                order.subtotal += item.price * lines[-1].quantity
+            order.apply_totals()
+        OrderItem.objects.bulk_create(lines, batch_size=1000)
+        Order.objects.bulk_update(orders, Order.TOTAL_FIELDS, batch_size=1000)
+        return [item.id for item in items], [order.id for order in orders]
+
+    def _cleanup(self, item_ids, order_ids):
+        from items.models import Item, Order, OrderItem
+        from items.signals import repricing_suspended
+
+        created = Order.objects.filter(id__in=OrderItem.objects.filter(item_id__in=item_ids).values("order_id"))
+        ids = sorted(set(order_ids) | set(created.values_list("id", flat=True)))
+        # No point re-pricing orders that are about to vanish.
+        with transaction.atomic(), repricing_suspended():
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            Order.objects.filter(id__in=ids).delete()
+        Item.objects.filter(id__in=item_ids).delete()
+
+    def _request(self, scenario, client, cart, item_ids, order_ids, rng):
+        if scenario == "item_page":
+            return client.get(f"/items/{rng.choice(item_ids)}/")
+        if scenario == "add_to_cart" or (scenario == "change_quantity" and not cart):
+            cart.append(rng.choice(item_ids))
+            return client.post(f"/add-to-cart/{cart[-1]}/")
+        if scenario == "cart_page":
+            return client.get("/cart/")
+        if scenario == "change_quantity":
+            return client.post(f"/cart/change/{rng.choice(cart)}/", {"delta": 1}, content_type="application/json")
+        return client.post(f"/buy-order/{rng.choice(order_ids)}/")
+
+    def _run(self, scenario, clients, item_ids, order_ids, options):
+        latencies, queries, errors = [], [], 0
+        lock = threading.Lock()
+        per_client = [options["requests"] // len(clients) + (i < options["requests"] % len(clients)) for i in range(len(clients))]
+        seeds = [self.random.random() for _ in clients]
+
+        def drive(index):
+            nonlocal errors
+            (client, cart), rng = clients[index], random.Random(seeds[index])
+            count = 0
+
+            def count_query(execute, *args):
+                nonlocal count
+                count += 1
+                return execute(*args)
+
+            try:
+                for _ in range(per_client[index]):
+                    count = 0
+                    started = time.perf_counter()
+                    with connection.execute_wrapper(count_query):
+                        try:
+                            status = self._request(scenario, client, cart, item_ids, order_ids, rng).status_code
+                        except Exception:
+                            status = 599
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        queries.append(count)
+                        errors += status >= 400
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            list(pool.map(drive, range(len(clients))))
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            return {"requests": 0, "errors": 0, "seconds": round(elapsed, 4)}
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 4),
+            "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentiles[49] * 1000, 2),
+            "p95_ms": round(percentiles[94] * 1000, 2),
+            "p99_ms": round(percentiles[98] * 1000, 2),
+            "queries_per_request": round(statistics.fmean(queries), 2),
+        }
+
+    def _print(self, scenario, result):
+        if not result["requests"]:
+            self.stdout.write(f"{scenario:>16}: no requests")
+            return
+        self.stdout.write(
+            f"{scenario:>16}: {result['requests']} req in {result['seconds']:.2f}s ({result['throughput']:.1f}/s) "
+            f"p50 {result['p50_ms']:.1f}ms p95 {result['p95_ms']:.1f}ms p99 {result['p99_ms']:.1f}ms "
+            f"{result['queries_per_request']:.1f} queries/req, {result['errors']} errors"
+        )
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, timeout=5
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
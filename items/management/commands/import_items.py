@@ -0,0 +1,48 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSONL catalog into Item, upserting by SKU in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or '-' for stdin.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--checkpoint", help="File recording committed rows; an existing one resumes the import.")
+
+    def handle(self, *args, **options):
+        from items.catalog_import import import_items, read_rows
+
+        path = options["path"]
+        fmt = options["format"]
+        if fmt is None:
+            ext = os.path.splitext(path)[1].lower().lstrip(".")
+            fmt = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(ext)
+            if fmt is None:
+                raise CommandError("Cannot infer the format, pass --format csv|jsonl.")
+
+        def report(result):
+            self.stdout.write(
+                f"batch {result.batches}: {result.rows} rows, {result.created} created, "
+                f"{result.updated} updated, {result.skipped} skipped ({result.rows_per_second:.0f} rows/s)"
+            )
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            result = import_items(
+                read_rows(stream, fmt),
+                batch_size=options["batch_size"],
+                checkpoint=options["checkpoint"],
+                on_batch=report,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.rows} rows ({result.created} created, {result.updated} updated, "
+            f"{result.skipped} skipped) in {result.elapsed:.2f}s ({result.rows_per_second:.0f} rows/s)"
+        ))
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Delete unpaid orders older than a given age in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, default=30, help="Minimum age of unpaid orders to delete.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        from items.cleanup import purge_stale_orders
+
+        def report(result):
+            self.stdout.write(
+                f"batch {result.batches}: {result.orders} orders, {result.order_items} lines "
+                f"({result.rows_per_second:.0f} rows/s)"
+            )
+
+        result = purge_stale_orders(
+            timedelta(days=options["days"]),
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            dry_run=options["dry_run"],
+            on_batch=report,
+        )
+
+        if result.dry_run:
+            space = "unknown" if result.estimated_bytes is None else f"~{result.estimated_bytes / 1024 / 1024:.1f} MiB"
+            self.stdout.write(self.style.WARNING(
+                f"Dry run: would delete {result.orders} orders and {result.order_items} lines, "
+                f"reclaiming {space}"
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {result.orders} orders and {result.order_items} lines in {result.batches} batch(es), "
+            f"{result.elapsed:.2f}s ({result.rows_per_second:.0f} rows/s)"
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Recount stored order totals from order lines and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--unpaid-only", action="store_true", help="Skip orders that are already paid.")
+
+    def handle(self, *args, **options):
+        from items.models import Order, recompute_order_totals
+
+        orders = Order.objects.all()
+        if options["unpaid_only"]:
+            orders = orders.filter(is_paid=False)
+
+        fixed = recompute_order_totals(orders, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Repaired totals on {fixed} order(s)"))
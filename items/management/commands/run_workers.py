@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Run background job workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Number of workers.")
+        parser.add_argument("--processes", action="store_true", help="Run workers as processes instead of threads.")
+        parser.add_argument("--type", dest="types", action="append", help="Only run jobs of this type (repeatable).")
+        parser.add_argument("--once", action="store_true", help="Drain runnable jobs and exit.")
+
+    def handle(self, *args, **options):
+        from items.jobs import run_pending
+
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        types = options["types"]
+
+        if options["once"]:
+            count = run_pending(worker_id=prefix, types=types)
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} job(s)"))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+        if options["processes"]:
+            # Children must not inherit the parent's open database connections.
+            connections.close_all()
+            workers = [
+                multiprocessing.Process(target=_process_worker, args=(f"{prefix}-p{i}", types), daemon=True)
+                for i in range(options["workers"])
+            ]
+        else:
+            from items.jobs import work
+
+            workers = [
+                threading.Thread(target=work, args=(f"{prefix}-t{i}", stop, types), daemon=True)
+                for i in range(options["workers"])
+            ]
+
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {len(workers)} worker(s)"))
+
+        stop.wait()
+        for worker in workers:
+            if isinstance(worker, multiprocessing.Process):
+                worker.terminate()
+            worker.join()
+
+
+def _process_worker(worker_id, types):
+    from items.jobs import work
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(worker_id, stop, types)
@@ -0,0 +1,133 @@
+import os
+import time
+from typing import Optional
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from stripe_app.postgresql_pool.pool import close_pools
+
+PRELOADED_TEMPLATES = ("items/item.html", "items/order.html", "items/catalog.html", "success.html", "cancel.html")
+
+
+def pending_migrations(database: str = DEFAULT_DB_ALIAS) -> list:
+    """
+    Migrations not yet applied to ``database``.
+
+    Reads the migration graph from disk and ``django_migrations`` in a couple
+    of queries, which is far cheaper than letting ``migrate`` do the same and more.
+    """
+    executor = MigrationExecutor(connections[database])
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process started, from ``/proc``; ``None`` where unavailable."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the site under a preforked gunicorn server, migrating first only if the schema is behind. "
+        "Send SIGHUP to the master for a graceful restart of the workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default=os.getenv("SERVE_BIND", "0.0.0.0:8000"))
+        parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", 2 * (os.cpu_count() or 1) + 1)))
+        parser.add_argument("--threads", type=int, default=int(os.getenv("SERVE_THREADS", 4)))
+        parser.add_argument("--timeout", type=int, default=30)
+        parser.add_argument("--graceful-timeout", type=int, default=30)
+        parser.add_argument("--max-requests", type=int, default=0, help="Recycle a worker after this many requests.")
+        parser.add_argument("--no-migrate", action="store_true", help="Never run migrations, even if some are pending.")
+        parser.add_argument("--bootstrap", action="store_true", help="Also run create_admin and initdata before serving.")
+
+    def handle(self, *args, **options):
+        # Report boot phases relative to process start, so interpreter and
+        # Django setup count towards cold start too.
+        started = time.perf_counter() - (process_age() or 0.0)
+        self.stdout.write(f"boot: django set up {time.perf_counter() - started:.2f}s after start")
+
+        check_started = time.perf_counter()
+        plan = pending_migrations()
+        self.stdout.write(f"boot: migration check {1000 * (time.perf_counter() - check_started):.0f}ms, {len(plan)} pending")
+        if plan and not options["no_migrate"]:
+            call_command("migrate", interactive=False, verbosity=1)
+        if options["bootstrap"]:
+            call_command("create_admin")
+            call_command("initdata")
+
+        application = self._load_application()
+        # Forked workers must not share the master's database sockets.
+        connections.close_all()
+        close_pools()
+        self.stdout.write(f"boot: application loaded {time.perf_counter() - started:.2f}s after start")
+
+        self._run(application, started, options)
+
+    def _load_application(self):
+        from django.conf import settings
+        from django.contrib.staticfiles.handlers import StaticFilesHandler
+        from django.core.wsgi import get_wsgi_application
+        from django.template.loader import get_template
+        from django.urls import get_resolver
+
+        application = get_wsgi_application()
+        if settings.DEBUG:
+            application = StaticFilesHandler(application)
+        # Import every view and compile the hot templates once, in the
+        # master, so workers share them copy-on-write.
+        get_resolver().url_patterns
+        for name in PRELOADED_TEMPLATES:
+            get_template(name)
+        return application
+
+    def _run(self, application, started, options):
+        from gunicorn.app.base import BaseApplication
+
+        stdout = self.stdout
+
+        def when_ready(server):
+            stdout.write(f"boot: listening on {options['bind']} {time.perf_counter() - started:.2f}s after start")
+
+        def post_request(worker, req, environ, resp):
+            if not getattr(worker, "served_first_request", False):
+                worker.served_first_request = True
+                stdout.write(
+                    f"boot: worker {worker.pid} served its first request "
+                    f"{time.perf_counter() - started:.2f}s after start"
+                )
+
+        config = {
+            "bind": options["bind"],
+            "workers": options["workers"],
+            "threads": options["threads"],
+            "worker_class": "gthread",
+            "timeout": options["timeout"],
+            "graceful_timeout": options["graceful_timeout"],
+            "max_requests": options["max_requests"],
+            "max_requests_jitter": options["max_requests"] // 10,
+            "preload_app": True,
+            "accesslog": "-",
+            "when_ready": when_ready,
+            "post_request": post_request,
+        }
+
+        class Server(BaseApplication):
+            def load_config(self):
+                for key, value in config.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return application
+
+        Server().run()
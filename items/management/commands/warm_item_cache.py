@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Pre-render and cache item pages for the whole catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        from items import page_cache
+        from items.models import Item
+
+        count = 0
+        for item in Item.objects.order_by("id").iterator(chunk_size=options["chunk_size"]):
+            page_cache.warm(item)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Warmed {count} item page(s)"))
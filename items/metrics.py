@@ -0,0 +1,218 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BACKGROUND = "background"
+
+
+@dataclass
+class RequestStats:
+    """Per-request tallies; owned by one request, so updated without locking."""
+
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    stripe_latencies: list[float] = field(default_factory=list)
+    render_seconds: float = 0.0
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+@dataclass
+class ViewMetrics:
+    requests: Histogram = field(default_factory=Histogram)
+    stripe: Histogram = field(default_factory=Histogram)
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    render_seconds: float = 0.0
+
+
+class MetricsStore:
+    """
+    In-process aggregate keyed by view name.
+
+    Requests tally into their own ``RequestStats`` and take the lock once,
+    at the end, to fold it in; rendering takes the lock only while copying.
+    Each worker process keeps its own store.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views: dict[str, ViewMetrics] = {}
+
+    def record(self, view: str, duration: Optional[float], stats: RequestStats) -> None:
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            if duration is not None:
+                metrics.requests.observe(duration)
+            for latency in stats.stripe_latencies:
+                metrics.stripe.observe(latency)
+            metrics.sql_count += stats.sql_count
+            metrics.sql_seconds += stats.sql_seconds
+            metrics.render_seconds += stats.render_seconds
+
+    def reset(self) -> None:
+        with self._lock:
+            self._views.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            views = {
+                name: (
+                    (list(m.requests.counts), m.requests.sum),
+                    (list(m.stripe.counts), m.stripe.sum),
+                    m.sql_count,
+                    m.sql_seconds,
+                    m.render_seconds,
+                )
+                for name, m in sorted(self._views.items())
+            }
+
+        lines = []
+        for metric, help_text, index in (
+            ("app_request_duration_seconds", "Request latency by view.", 0),
+            ("app_stripe_request_duration_seconds", "Stripe API call latency by view.", 1),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for name, values in views.items():
+                counts, total = values[index]
+                lines += _histogram_lines(metric, name, counts, total)
+        for metric, kind, help_text, index in (
+            ("app_sql_queries_total", "counter", "SQL queries executed by view.", 2),
+            ("app_sql_duration_seconds_total", "counter", "Time spent in SQL by view.", 3),
+            ("app_template_render_seconds_total", "counter", "Time spent rendering templates by view.", 4),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            for name, values in views.items():
+                lines.append(f'{metric}{{view="{name}"}} {values[index]}')
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(metric: str, view: str, counts: list[int], total: float) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_sum{{view="{view}"}} {total}')
+    lines.append(f'{metric}_count{{view="{view}"}} {cumulative}')
+    return lines
+
+
+store = MetricsStore()
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def record_sql(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_count += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def install_sql_wrapper(sender, connection, **kwargs) -> None:
+    """Attach ``record_sql`` to every new connection, in any thread."""
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_sql)
+
+
+connection_created.connect(install_sql_wrapper, dispatch_uid="items.metrics.install_sql_wrapper")
+
+
+def record_stripe_call(seconds: float) -> None:
+    stats = _current.get()
+    if stats is None:
+        store.record(BACKGROUND, None, RequestStats(stripe_latencies=[seconds]))
+        return
+    stats.stripe_latencies.append(seconds)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.render_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` whose templates add their render time to the current request."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            self._record(request, started, token, stats)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            self._record(request, started, token, stats)
+
+    @staticmethod
+    def _record(request: HttpRequest, started: float, token, stats: RequestStats) -> None:
+        duration = time.perf_counter() - started
+        _current.reset(token)
+        match = getattr(request, "resolver_match", None)
+        store.record(match.url_name or match.view_name if match else "unresolved", duration, stats)
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    return HttpResponse(store.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
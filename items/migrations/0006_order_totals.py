@@ -0,0 +1,65 @@
+# Generated by Django 5.0 on 2026-10-18 12:32
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model('items', 'Order')
+    orders = Order.objects.select_related('discount', 'tax').annotate(
+        lines_subtotal=Coalesce(Sum(F('order_items__quantity') * F('order_items__item__price')), 0),
+    )
+    batch = []
+    for order in orders.iterator(chunk_size=1000):
+        subtotal = order.lines_subtotal
+        discount_amount = 0
+        if order.discount and order.discount.is_active:
+            if order.discount.discount_type == 'percentage':
+                discount_amount = int(subtotal * order.discount.value / 100)
+            else:
+                discount_amount = min(order.discount.value, subtotal)
+        tax_amount = 0
+        if order.tax and order.tax.is_active:
+            tax_amount = int((subtotal - discount_amount) * float(order.tax.percentage) / 100)
+        order.subtotal = subtotal
+        order.discount_amount = discount_amount
+        order.tax_amount = tax_amount
+        order.total = subtotal - discount_amount + tax_amount
+        batch.append(order)
+        if len(batch) >= 1000:
+            Order.objects.bulk_update(batch, ['subtotal', 'discount_amount', 'tax_amount', 'total'])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ['subtotal', 'discount_amount', 'tax_amount', 'total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0005_alter_order_options_alter_discount_discount_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount_amount',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='tax_amount',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
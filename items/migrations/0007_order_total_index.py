@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0006_order_totals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='total',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
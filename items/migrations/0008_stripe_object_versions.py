@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0007_order_total_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discount',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tax',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -1,20 +1,80 @@
-from django.db import models
+from dataclasses import dataclass
+
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
 
 
 class Item(models.Model):    
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=60)
     description = models.TextField(max_length=1000, blank=True)
     price = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'id'], name='items_item_price_id'),
+            models.Index(fields=['name', 'id'], name='items_item_name_id'),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs) -> None:
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "updated_at"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_price = instance.__dict__.get("price")
+        return instance
+
     @property
     def price_dollars(self) -> float:
         return self.price / 100
 
 
-class Discount(models.Model):
+class StripeVersionedModel(models.Model):
+    """Bumps ``version`` and drops the cached Stripe id whenever the terms Stripe was given change."""
+
+    STRIPE_ID_FIELD: str
+    STRIPE_TERMS: tuple[str, ...]
+
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_terms = instance.stripe_terms
+        return instance
+
+    @property
+    def stripe_terms(self) -> tuple:
+        return tuple(self.__dict__.get(field) for field in self.STRIPE_TERMS)
+
+    def save(self, *args, **kwargs) -> None:
+        loaded_terms = getattr(self, "_loaded_terms", None)
+        if self.pk and loaded_terms is not None and loaded_terms != self.stripe_terms:
+            self.version += 1
+            setattr(self, self.STRIPE_ID_FIELD, None)
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version", self.STRIPE_ID_FIELD}
+        super().save(*args, **kwargs)
+        self._loaded_terms = self.stripe_terms
+
+
+class Discount(StripeVersionedModel):
+    STRIPE_ID_FIELD = "stripe_coupon_id"
+    STRIPE_TERMS = ("discount_type", "value")
+
     PERCENTAGE = 'percentage'
     FIXED = 'fixed'
     
@@ -41,7 +101,10 @@ class Discount(models.Model):
         return min(self.value, subtotal)
 
 
-class Tax(models.Model):
+class Tax(StripeVersionedModel):
+    STRIPE_ID_FIELD = "stripe_tax_rate_id"
+    STRIPE_TERMS = ("percentage",)
+
     name = models.CharField(max_length=100)
     percentage = models.DecimalField(max_digits=5, decimal_places=2)
     stripe_tax_rate_id = models.CharField(max_length=100, blank=True, null=True)
@@ -56,41 +119,103 @@ class Tax(models.Model):
 
 
 class Order(models.Model):
+    TOTAL_FIELDS = ("subtotal", "discount_amount", "tax_amount", "total")
+    PRICING_FIELDS = ("subtotal", "discount_id", "tax_id")
+
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     items = models.ManyToManyField(Item, through='OrderItem', related_name='orders')
     discount = models.ForeignKey(Discount, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     tax = models.ForeignKey(Tax, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     is_paid = models.BooleanField(default=False)
+    subtotal = models.PositiveIntegerField(default=0, editable=False)
+    discount_amount = models.PositiveIntegerField(default=0, editable=False)
+    tax_amount = models.PositiveIntegerField(default=0, editable=False)
+    total = models.PositiveIntegerField(default=0, editable=False, db_index=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_paid', 'created_at'], name='items_order_paid_created'),
+        ]
 
     def __str__(self) -> str:
         return f"Order #{self.id}"
 
-    @property
-    def subtotal(self) -> int:
-        return sum(oi.item.price * oi.quantity for oi in self.order_items.select_related("item").all())
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_pricing = instance._pricing_inputs()
+        return instance
 
-    @property
-    def discount_amount(self) -> int:
-        if self.discount and self.discount.is_active:
-            return self.discount.calculate_amount(self.subtotal)
-        return 0
+    def _pricing_inputs(self) -> tuple:
+        # From __dict__ so deferred fields are not fetched one query at a time.
+        return tuple(self.__dict__.get(field) for field in self.PRICING_FIELDS)
 
-    @property
-    def subtotal_after_discount(self) -> int:
-        return self.subtotal - self.discount_amount
+    def save(self, *args, **kwargs) -> None:
+        """
+        Re-price the order when its subtotal, discount or tax changed since it was loaded.
 
-    @property
-    def tax_amount(self) -> int:
+        A paid order keeps the totals it was paid with. Other saves, such as
+        marking the order paid, do not load the discount or tax.
+        """
+        repriced = self._state.adding or (
+            not self.is_paid and self._pricing_inputs() != getattr(self, "_loaded_pricing", None)
+        )
+        if repriced:
+            self.apply_totals()
+        if kwargs.get("update_fields") is not None:
+            extra = self.TOTAL_FIELDS if repriced else ()
+            kwargs["update_fields"] = {*kwargs["update_fields"], *extra, "updated_at"}
+        super().save(*args, **kwargs)
+        self._loaded_pricing = self._pricing_inputs()
+
+    def calculate_amounts(self, subtotal: int) -> tuple[int, int]:
+        """Return ``(discount_amount, tax_amount)`` for the given subtotal."""
+        discount_amount = 0
+        if self.discount and self.discount.is_active:
+            discount_amount = self.discount.calculate_amount(subtotal)
+
+        tax_amount = 0
         if self.tax and self.tax.is_active:
-            return self.tax.calculate_amount(self.subtotal_after_discount)
-        return 0
+            tax_amount = self.tax.calculate_amount(subtotal - discount_amount)
+
+        return discount_amount, tax_amount
+
+    def apply_totals(self) -> None:
+        self.discount_amount, self.tax_amount = self.calculate_amounts(self.subtotal)
+        self.total = self.subtotal - self.discount_amount + self.tax_amount
+
+    @classmethod
+    def add_to_subtotal(cls, order_id: int, delta: int) -> None:
+        """Shift the stored subtotal by ``delta`` cents under a row lock."""
+        with transaction.atomic():
+            order = (
+                cls.objects.select_for_update(of=("self",))
+                .select_related("discount", "tax")
+                .filter(id=order_id)
+                .first()
+            )
+            if order is None:
+                return
+            order.subtotal = max(order.subtotal + delta, 0)
+            order.save(update_fields=["subtotal"])
+
+    @cached_property
+    def pricing(self) -> "OrderPricing":
+        return OrderPricing.for_order(self)
+
+    def invalidate_pricing(self) -> None:
+        self.__dict__.pop("pricing", None)
+
+    def refresh_from_db(self, *args, **kwargs) -> None:
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_pricing = self._pricing_inputs()
+        self.invalidate_pricing()
 
     @property
-    def total(self) -> int:
-        return self.subtotal_after_discount + self.tax_amount
+    def subtotal_after_discount(self) -> int:
+        return self.subtotal - self.discount_amount
 
     @property
     def total_dollars(self) -> float:
@@ -109,6 +234,75 @@ class Order(models.Model):
         return self.tax_amount / 100.0
 
 
+@dataclass(frozen=True)
+class OrderPricing:
+    """Order lines and totals computed together from a single lines query."""
+
+    lines: tuple["OrderItem", ...]
+    subtotal: int
+    discount_amount: int
+    tax_amount: int
+
+    @classmethod
+    def for_order(cls, order: Order) -> "OrderPricing":
+        if "order_items" in getattr(order, "_prefetched_objects_cache", {}):
+            return cls.from_lines(order, order.order_items.all())
+        return cls.from_lines(order, order.order_items.select_related("item"))
+
+    @classmethod
+    def from_lines(cls, order: Order, lines) -> "OrderPricing":
+        lines = tuple(lines)
+        subtotal = sum(oi.line_total for oi in lines)
+        discount_amount, tax_amount = order.calculate_amounts(subtotal)
+
+        return cls(
+            lines=lines,
+            subtotal=subtotal,
+            discount_amount=discount_amount,
+            tax_amount=tax_amount,
+        )
+
+    @property
+    def subtotal_after_discount(self) -> int:
+        return self.subtotal - self.discount_amount
+
+    @property
+    def total(self) -> int:
+        return self.subtotal_after_discount + self.tax_amount
+
+
+def recompute_order_totals(orders: models.QuerySet, batch_size: int = 1000) -> int:
+    """Recount stored totals from the order lines; return how many orders drifted."""
+    orders = (
+        orders.select_related("discount", "tax")
+        .annotate(
+            lines_subtotal=Coalesce(
+                Sum(F("order_items__quantity") * F("order_items__item__price")),
+                0,
+            )
+        )
+        .order_by("pk")
+    )
+    fields = (*Order.TOTAL_FIELDS, "updated_at")
+    drifted = []
+    fixed = 0
+    for order in orders.iterator(chunk_size=batch_size):
+        stored = tuple(getattr(order, field) for field in Order.TOTAL_FIELDS)
+        order.subtotal = order.lines_subtotal
+        order.apply_totals()
+        if tuple(getattr(order, field) for field in Order.TOTAL_FIELDS) != stored:
+            order.updated_at = timezone.now()
+            drifted.append(order)
+        if len(drifted) >= batch_size:
+            Order.objects.bulk_update(drifted, fields)
+            fixed += len(drifted)
+            drifted = []
+    if drifted:
+        Order.objects.bulk_update(drifted, fields)
+        fixed += len(drifted)
+    return fixed
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="order_items")
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
@@ -118,4 +312,74 @@ class OrderItem(models.Model):
         unique_together = ("order", "item")
 
     def __str__(self) -> str:
-        return f"{self.quantity} × {self.item.name}"
\ No newline at end of file
+        return f"{self.quantity} × {self.item.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_line = (instance.item_id, instance.quantity)
+        return instance
+
+    def save(self, *args, **kwargs) -> None:
+        # Keep the line and the order's stored totals in one transaction;
+        # the delta itself is applied by the post_save receiver.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @property
+    def line_total(self) -> int:
+        return self.item.price * self.quantity
+
+
+class StripeEvent(models.Model):
+    """Raw Stripe webhook event, stored once per event id and processed later in batches."""
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self) -> str:
+        return f"{self.type} ({self.event_id})"
+
+
+class Job(models.Model):
+    """Unit of background work claimed and run by ``run_workers``."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    DEAD = 'dead'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (DEAD, 'Dead'),
+    ]
+
+    type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='items_job_status_run_at'),
+            models.Index(fields=['type', 'status'], name='items_job_type_status'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.type} #{self.id} ({self.status})"
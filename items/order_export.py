@@ -0,0 +1,79 @@
+import csv
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, QuerySet, Sum
+from django.db.models.functions import Coalesce
+
+from .db_router import REPLICA, replica_configured
+from .models import Order
+
+FIELDS = (
+    "id", "created_at", "lines", "quantity", "subtotal",
+    "discount", "discount_amount", "tax", "tax_amount", "total",
+)
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+CHUNK_SIZE = 2000
+
+
+def export_database() -> str:
+    """The replica when there is one: exports tolerate lag and are heavy reads."""
+    return REPLICA if replica_configured() else DEFAULT_DB_ALIAS
+
+
+def paid_orders(
+    queryset: Optional[QuerySet] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> QuerySet:
+    """
+    Paid orders as flat rows of ``FIELDS``, oldest first.
+
+    Line and quantity counts are aggregated by the database; amounts are the
+    stored totals in cents. ``since`` is inclusive, ``until`` exclusive.
+    """
+    queryset = (queryset if queryset is not None else Order.objects.all()).filter(is_paid=True)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    return (
+        queryset.order_by("created_at", "id")
+        .annotate(
+            lines=Count("order_items"),
+            quantity=Coalesce(Sum("order_items__quantity"), 0),
+        )
+        .values_list(
+            "id", "created_at", "lines", "quantity", "subtotal",
+            "discount__name", "discount_amount", "tax__name", "tax_amount", "total",
+        )
+    )
+
+
+def iter_rows(queryset: QuerySet, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """Rows fetched ``chunk_size`` at a time through a server-side cursor where the backend has one."""
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield (row[0], row[1].isoformat(), *row[2:])
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the formatted line back to ``csv.writer``."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def render(rows: Iterable[tuple], fmt: str) -> Iterator[str]:
+    """Yield the export one line at a time, so it never sits in memory whole."""
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+    elif fmt == "jsonl":
+        for row in rows:
+            yield json.dumps(dict(zip(FIELDS, row))) + "\n"
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}")
@@ -0,0 +1,116 @@
+import functools
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import get_template, render_to_string
+
+from .models import Item
+
+HITS_KEY = "item-page:hits"
+MISSES_KEY = "item-page:misses"
+TEMPLATE = "items/item.html"
+# Pages whose validators follow the release: the item page and the cart.
+RELEASE_TEMPLATES = (TEMPLATE, "items/order.html")
+
+
+@functools.cache
+def _release() -> tuple[str, datetime]:
+    """Hash and latest mtime of the release templates and the static manifest their asset URLs come from."""
+    paths = [
+        *(get_template(name).origin.name for name in RELEASE_TEMPLATES),
+        os.path.join(settings.STATIC_ROOT, ManifestStaticFilesStorage.manifest_name),
+    ]
+    digest, mtime = hashlib.sha256(), 0.0
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+            mtime = max(mtime, os.path.getmtime(path))
+        except OSError:
+            pass
+    return digest.hexdigest()[:16], datetime.fromtimestamp(mtime, timezone.utc)
+
+
+def page_version() -> str:
+    """Changes with every deploy that changes how item or cart pages render; read once per process."""
+    return _release()[0]
+
+
+def page_modified_at() -> datetime:
+    return _release()[1]
+
+
+def item_key(item_id: int) -> str:
+    return f"item:{item_id}"
+
+
+def page_key(item_id: int) -> str:
+    return f"item-page:{item_id}:{page_version()}"
+
+
+def _count(key: str) -> None:
+    # incr() is atomic on Redis and memcached; on the file cache concurrent hits may undercount.
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_item(item_id: int) -> Optional[Item]:
+    """Return the item from cache, loading and caching it on a miss."""
+    item = cache.get(item_key(item_id), version=settings.ITEM_CACHE_VERSION)
+    if item is None:
+        # From the primary: a lagging replica could re-cache the version just invalidated.
+        item = Item.objects.using(DEFAULT_DB_ALIAS).filter(id=item_id).first()
+        if item is not None:
+            cache.set(item_key(item_id), item, settings.ITEM_CACHE_TIMEOUT, version=settings.ITEM_CACHE_VERSION)
+    return item
+
+
+def render_item_page(item: Item) -> str:
+    return render_to_string(TEMPLATE, {
+        "item": item,
+        "stripe_pk": settings.STRIPE_PUBLISHABLE_KEY,
+    })
+
+
+def get_item_page(item_id: int) -> Optional[str]:
+    """Return the rendered item page body; a cache hit runs no queries."""
+    body = cache.get(page_key(item_id), version=settings.ITEM_CACHE_VERSION)
+    if body is not None:
+        _count(HITS_KEY)
+        return body
+
+    _count(MISSES_KEY)
+    item = get_item(item_id)
+    if item is None:
+        return None
+    body = render_item_page(item)
+    cache.set(page_key(item_id), body, settings.ITEM_CACHE_TIMEOUT, version=settings.ITEM_CACHE_VERSION)
+    return body
+
+
+def warm(item: Item) -> None:
+    cache.set_many(
+        {item_key(item.id): item, page_key(item.id): render_item_page(item)},
+        settings.ITEM_CACHE_TIMEOUT,
+        version=settings.ITEM_CACHE_VERSION,
+    )
+
+
+def invalidate(item_id: int) -> None:
+    cache.delete_many([item_key(item_id), page_key(item_id)], version=settings.ITEM_CACHE_VERSION)
+
+
+def stats() -> dict[str, float]:
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
@@ -0,0 +1,6 @@
+"""
+Session engines selected by ``SESSION_BACKEND`` (see ``stripe_app/settings.py``).
+
+Each one takes over a session left by the other when the setting changes,
+so switching engines does not empty visitors' carts.
+"""
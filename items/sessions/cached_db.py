@@ -0,0 +1,41 @@
+import copy
+
+from django.contrib.sessions.backends import cached_db, signed_cookies
+
+
+class SessionStore(cached_db.SessionStore):
+    """
+    Sessions read from the ``sessions`` cache and written through to the table.
+
+    The table is only read on a cache miss, e.g. for sessions created before
+    the switch to this engine. Saving data identical to what was loaded is
+    skipped when the session expires at a fixed date, so a request that
+    merely reassigns its values costs nothing. Sessions that expire a set
+    age after their last save (the default) are always written, so the
+    stored expiry moves along with the renewed cookie.
+    """
+
+    _loaded = None
+
+    def load(self):
+        session_key = self._session_key
+        data = super().load()
+        if not data and session_key and ":" in session_key:
+            # A cookie from the signed-cookie engine; keep its data as a new session.
+            data = signed_cookies.SessionStore(session_key).load()
+            self._session_key = None
+            self.modified = bool(data)
+        self._loaded = copy.deepcopy(data)
+        return data
+
+    def save(self, must_create=False):
+        if (
+            not must_create
+            and self.session_key is not None
+            and self._loaded == self._session
+            and isinstance(self._session.get("_session_expiry"), str)
+        ):
+            # A fixed expiry is stored as an ISO date and did not move either.
+            return
+        super().save(must_create)
+        self._loaded = copy.deepcopy(self._session)
@@ -0,0 +1,17 @@
+from django.contrib.sessions.backends import db, signed_cookies
+
+
+class SessionStore(signed_cookies.SessionStore):
+    """
+    Sessions kept entirely in a signed cookie; no storage is read or written.
+
+    A cookie still holding a database session key is resolved once from the
+    table and re-issued as a signed cookie.
+    """
+
+    def load(self):
+        session_key = self.session_key
+        data = super().load()
+        if not data and session_key and ":" not in session_key:
+            data = db.SessionStore(session_key).load()
+        return data
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import jobs, page_cache
+from .models import Discount, Item, Order, OrderItem, Tax, recompute_order_totals
+
+_repricing: ContextVar[bool] = ContextVar("repricing", default=True)
+
+
+@contextmanager
+def repricing_suspended():
+    """Leave order totals alone as lines change in this block, e.g. while deleting whole orders."""
+    token = _repricing.set(False)
+    try:
+        yield
+    finally:
+        _repricing.reset(token)
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance: OrderItem, raw: bool = False, **kwargs) -> None:
+    if raw or not _repricing.get():
+        return
+    old_item_id, old_quantity = getattr(instance, "_loaded_line", (None, 0))
+    delta = instance.line_total
+    if old_quantity:
+        if old_item_id == instance.item_id:
+            delta -= instance.item.price * old_quantity
+        else:
+            delta -= Item.objects.values_list("price", flat=True).get(id=old_item_id) * old_quantity
+    instance._loaded_line = (instance.item_id, instance.quantity)
+    if delta:
+        Order.add_to_subtotal(instance.order_id, delta)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance: OrderItem, **kwargs) -> None:
+    if not _repricing.get():
+        return
+    item_id, quantity = getattr(instance, "_loaded_line", (instance.item_id, instance.quantity))
+    if not quantity:
+        return
+    price = Item.objects.values_list("price", flat=True).filter(id=item_id).first()
+    if price:
+        Order.add_to_subtotal(instance.order_id, -price * quantity)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def item_changed(sender, instance: Item, **kwargs) -> None:
+    # After commit: a miss before then would re-cache the old row for ITEM_CACHE_TIMEOUT.
+    # The id is bound now, delete() clears it on the instance before the commit.
+    item_id = instance.id
+    transaction.on_commit(lambda: page_cache.invalidate(item_id))
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance: Item, created: bool, raw: bool = False, **kwargs) -> None:
+    loaded_price = getattr(instance, "_loaded_price", None)
+    instance._loaded_price = instance.price
+    if created or raw or loaded_price in (None, instance.price):
+        return
+    order_ids = OrderItem.objects.filter(item=instance).values("order_id")
+    recompute_order_totals(Order.objects.filter(is_paid=False, id__in=order_ids))
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_save, sender=Tax)
+def adjustment_saved(sender, instance, created: bool, raw: bool = False, **kwargs) -> None:
+    if created or raw:
+        return
+    recompute_order_totals(instance.orders.filter(is_paid=False))
+
+
+@receiver(post_delete, sender=Discount)
+def discount_deleted(sender, instance: Discount, **kwargs) -> None:
+    # SET_NULL has already detached the orders; their stored discount is now stale.
+    recompute_order_totals(Order.objects.filter(is_paid=False, discount__isnull=True).exclude(discount_amount=0))
+
+
+@receiver(post_delete, sender=Tax)
+def tax_deleted(sender, instance: Tax, **kwargs) -> None:
+    recompute_order_totals(Order.objects.filter(is_paid=False, tax__isnull=True).exclude(tax_amount=0))
+
+
+@receiver(post_save, sender=Discount)
+def discount_needs_coupon(sender, instance: Discount, raw: bool = False, **kwargs) -> None:
+    if not raw and instance.is_active and not instance.stripe_coupon_id:
+        jobs.enqueue_unique("stripe.create_coupon", {"discount_id": instance.id})
+
+
+@receiver(post_save, sender=Tax)
+def tax_needs_tax_rate(sender, instance: Tax, raw: bool = False, **kwargs) -> None:
+    if not raw and instance.is_active and not instance.stripe_tax_rate_id:
+        jobs.enqueue_unique("stripe.create_tax_rate", {"tax_id": instance.id})
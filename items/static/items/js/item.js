@@ -0,0 +1,88 @@
+const stripe = Stripe(document.body.dataset.stripeKey);
+const itemId = Number(document.body.dataset.itemId);
+
+document.getElementById('buyButton').addEventListener('click', async function() {
+    const button = this;
+    button.disabled = true;
+    button.textContent = 'Processing...';
+
+    try {
+        const response = await fetch(`/buy/${itemId}/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            }
+        });
+
+        const data = await response.json();
+
+        if (data.id) {
+            await stripe.redirectToCheckout({ sessionId: data.id });
+        } else {
+            alert('Error creating checkout session');
+            button.disabled = false;
+            button.textContent = 'Buy Now';
+        }
+    } catch (error) {
+        console.error(error);
+        alert('Error processing payment');
+        button.disabled = false;
+        button.textContent = 'Buy Now';
+    }
+});
+
+document.getElementById('addToCartButton').addEventListener('click', async function() {
+    const button = this;
+    button.disabled = true;
+    button.textContent = 'Adding...';
+
+    try {
+        const response = await fetch(`/add-to-cart/${itemId}/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            }
+        });
+
+        const data = await response.json();
+
+        if (data.ok) {
+            showNotification(data.quantity > 1
+                ? `${data.item_name} added to cart (${data.quantity} in cart)`
+                : `${data.item_name} added to cart`);
+        }
+    } catch (error) {
+        console.error(error);
+        alert('Error adding to cart');
+    } finally {
+        button.disabled = false;
+        button.textContent = 'Add to Cart';
+    }
+});
+
+function showNotification(message) {
+    const notification = document.getElementById('notification');
+    notification.textContent = message;
+    notification.style.display = 'block';
+
+    setTimeout(() => {
+        notification.style.display = 'none';
+    }, 3000);
+}
+
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
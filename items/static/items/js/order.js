@@ -0,0 +1,94 @@
+async function changeQuantity(itemId, currentQuantity, delta) {
+    if (currentQuantity + delta < 1) return;
+
+    try {
+        const response = await fetch(`/cart/change/${itemId}/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({ delta: delta })
+        });
+
+        if (response.ok) {
+            location.reload();
+        } else {
+            alert('Error changing quantity');
+        }
+    } catch (error) {
+        console.error(error);
+        alert('Error changing quantity');
+    }
+}
+
+async function deleteItem(itemId) {
+    if (!confirm('Delete this item from cart?')) return;
+
+    try {
+        const response = await fetch(`/cart/delete/${itemId}/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            }
+        });
+
+        if (response.ok) {
+            location.reload();
+        } else {
+            alert('Error deleting item');
+        }
+    } catch (error) {
+        console.error(error);
+        alert('Error deleting item');
+    }
+}
+
+const checkoutButton = document.getElementById('checkoutButton');
+if (checkoutButton) {
+    checkoutButton.addEventListener('click', async function() {
+        const button = this;
+        button.disabled = true;
+        button.textContent = 'Processing...';
+
+        try {
+            const response = await fetch('/buy-order/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken')
+                }
+            });
+
+            const data = await response.json();
+
+            if (data.id) {
+                const stripe = Stripe(document.body.dataset.stripeKey);
+                await stripe.redirectToCheckout({ sessionId: data.id });
+            } else {
+                throw new Error(data.error || 'No session ID');
+            }
+        } catch (error) {
+            console.error(error);
+            alert('Error processing checkout: ' + error.message);
+            button.disabled = false;
+            button.textContent = 'Proceed to Checkout';
+        }
+    });
+}
+
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
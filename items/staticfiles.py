@@ -0,0 +1,198 @@
+import gzip
+import json
+import mimetypes
+import os
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpRequest, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip variants are built
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".mjs", ".map", ".svg", ".json", ".txt", ".html", ".xml")
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes ``.gz`` and ``.br`` variants at ``collectstatic`` time.
+
+    Text files are compressed once, at the highest levels, next to both the
+    original and the hashed copy; a variant that does not save at least 5%
+    is not kept. A name missing from the manifest (nothing collected yet,
+    as in development and tests) resolves to itself instead of failing.
+    """
+
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        collected = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                collected.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if not dry_run:
+            for name in sorted(collected):
+                self._compress(name)
+
+    def _compress(self, name: str) -> None:
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        path = self.path(name)
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for suffix, compress in _compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data) * 0.95:
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+@dataclass(frozen=True)
+class StaticFile:
+    path: str
+    content_type: str
+    mtime: float
+    encodings: tuple[tuple[str, str], ...]
+    immutable: bool
+
+
+def scan_static_root(root: str, prefix: str) -> dict[str, StaticFile]:
+    """Index collected files by URL path, noting their compressed variants."""
+    try:
+        with open(os.path.join(root, ManifestStaticFilesStorage.manifest_name)) as f:
+            hashed = set(json.load(f)["paths"].values())
+    except (OSError, ValueError, KeyError):
+        hashed = set()
+
+    files = {}
+    for directory, _, names in os.walk(root):
+        for filename in names:
+            if filename.endswith((".gz", ".br")) or filename == ManifestStaticFilesStorage.manifest_name:
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            stat = os.stat(path)
+            content_type, _ = mimetypes.guess_type(filename)
+            files[prefix + name] = StaticFile(
+                path=path,
+                content_type=content_type or "application/octet-stream",
+                mtime=stat.st_mtime,
+                encodings=tuple(
+                    (encoding, path + suffix)
+                    for encoding, suffix in (("br", ".br"), ("gzip", ".gz"))
+                    if os.path.exists(path + suffix)
+                ),
+                immutable=name in hashed,
+            )
+    return files
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            weight = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            weight = 0.0
+        if weight > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serve files collected into ``STATIC_ROOT`` before sessions, auth or URL routing run.
+
+    Picks the Brotli or gzip variant the client accepts, and marks
+    fingerprinted (manifest-hashed) files immutable for a year; other files
+    get ``STATIC_MAX_AGE``. The directory is indexed once, at startup, so
+    run ``collectstatic`` before starting the server. Not used when
+    ``STATIC_ROOT`` does not exist or ``STATIC_URL`` points at another host.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        prefix = settings.STATIC_URL
+        if not settings.STATIC_ROOT or not os.path.isdir(settings.STATIC_ROOT) or not prefix.startswith("/"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = prefix
+        self.files = scan_static_root(settings.STATIC_ROOT, prefix)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.lookup(request)
+        if static_file is not None:
+            return self.serve(request, static_file)
+        return self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        static_file = self.lookup(request)
+        if static_file is not None:
+            # Only stats and opens the file; the body is streamed by the server.
+            return self.serve(request, static_file)
+        return await self.get_response(request)
+
+    def lookup(self, request: HttpRequest):
+        if request.method in ("GET", "HEAD") and request.path_info.startswith(self.prefix):
+            return self.files.get(request.path_info)
+        return None
+
+    def serve(self, request: HttpRequest, static_file: StaticFile) -> HttpResponse:
+        if static_file.immutable:
+            # Fingerprinted content never changes, so any cached copy is current.
+            not_modified = "HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META
+        else:
+            not_modified = not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), static_file.mtime)
+        if not_modified:
+            response = HttpResponseNotModified()
+        else:
+            accepted = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+            encoding, path = next(
+                ((encoding, path) for encoding, path in static_file.encodings if encoding in accepted),
+                (None, static_file.path),
+            )
+            if request.method == "HEAD":
+                response = HttpResponse(content_type=static_file.content_type)
+                response["Content-Length"] = os.path.getsize(path)
+            else:
+                response = FileResponse(open(path, "rb"), content_type=static_file.content_type)
+            if encoding:
+                response["Content-Encoding"] = encoding
+
+        response["Cache-Control"] = IMMUTABLE if static_file.immutable else f"public, max-age={settings.STATIC_MAX_AGE}"
+        response["Last-Modified"] = http_date(static_file.mtime)
+        if static_file.encodings:
+            response["Vary"] = "Accept-Encoding"
+        return response
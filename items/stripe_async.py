@@ -0,0 +1,75 @@
+import asyncio
+import time
+import weakref
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlencode
+
+import httpx
+import stripe
+from django.conf import settings
+
+from . import metrics
+from .stripe_client import get_stripe_client
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def encode_params(params: Dict[str, Any], prefix: Optional[str] = None) -> Iterator[tuple[str, str]]:
+    """Flatten nested params into Stripe's ``a[b][0]=c`` form encoding."""
+    for key, value in params.items():
+        name = f"{prefix}[{key}]" if prefix else key
+        yield from _encode_value(name, value)
+
+
+def _encode_value(name: str, value: Any) -> Iterator[tuple[str, str]]:
+    if value is None:
+        return
+    if isinstance(value, dict):
+        yield from encode_params(value, name)
+    elif isinstance(value, (list, tuple)):
+        for i, element in enumerate(value):
+            yield from _encode_value(f"{name}[{i}]", element)
+    elif isinstance(value, bool):
+        yield name, "true" if value else "false"
+    else:
+        yield name, str(value)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the keep-alive client shared by every request on the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=get_stripe_client().api_base,
+            limits=httpx.Limits(
+                max_connections=settings.STRIPE_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.STRIPE_ASYNC_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(settings.STRIPE_READ_TIMEOUT, connect=settings.STRIPE_CONNECT_TIMEOUT),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def create_checkout_session(**params: Any) -> stripe.checkout.Session:
+    started = time.perf_counter()
+    try:
+        response = await get_async_client().post(
+            "/v1/checkout/sessions",
+            content=urlencode(list(encode_params(params))),
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            auth=(get_stripe_client().api_key or "", ""),
+        )
+    finally:
+        metrics.record_stripe_call(time.perf_counter() - started)
+    body = response.json()
+    if response.is_error:
+        error = body.get("error", {})
+        raise stripe.error.APIError(
+            error.get("message", response.text),
+            http_body=response.text,
+            http_status=response.status_code,
+            json_body=body,
+        )
+    return stripe.util.convert_to_stripe_object(body, get_stripe_client().api_key)
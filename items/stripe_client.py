@@ -0,0 +1,124 @@
+import threading
+import time
+import uuid
+from typing import Any, Optional
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+
+class RetryingRequestsClient(stripe.http_client.RequestsClient):
+    """
+    ``RequestsClient`` with its own retry budget that also retries 429s.
+
+    Connection errors, 409 and 5xx responses are already retried by the base
+    class with jittered exponential backoff that honours ``Retry-After``.
+    """
+
+    def __init__(self, max_retries: int = 2, **kwargs):
+        super().__init__(**kwargs)
+        self.max_retries = max_retries
+
+    def _max_network_retries(self) -> int:
+        return self.max_retries
+
+    def request_with_retries(self, method, url, headers, post_data=None):
+        started = time.perf_counter()
+        try:
+            return super().request_with_retries(method, url, headers, post_data)
+        finally:
+            metrics.record_stripe_call(time.perf_counter() - started)
+
+    def _should_retry(self, response, api_connection_error, num_retries) -> bool:
+        if response is not None and response[1] == 429 and num_retries < self.max_retries:
+            return True
+        return super()._should_retry(response, api_connection_error, num_retries)
+
+
+class StripeClient:
+    """Sync Stripe entry point sharing one pooled keep-alive session across threads."""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        api_base: str,
+        connect_timeout: float,
+        read_timeout: float,
+        max_retries: int,
+        pool_size: int,
+    ):
+        self.api_key = api_key
+        self.api_base = api_base
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self.http_client = RetryingRequestsClient(
+            timeout=(connect_timeout, read_timeout),
+            session=session,
+            max_retries=max_retries,
+        )
+
+    @classmethod
+    def from_settings(cls) -> "StripeClient":
+        api_key, api_base = settings.STRIPE_SECRET_KEY, settings.STRIPE_API_BASE
+        if settings.STRIPE_FAKE_BACKEND:
+            from .stripe_standin import shared_standin
+
+            api_key, api_base = "sk_test_fake", shared_standin().url
+        return cls(
+            api_key=api_key,
+            api_base=api_base,
+            connect_timeout=settings.STRIPE_CONNECT_TIMEOUT,
+            read_timeout=settings.STRIPE_READ_TIMEOUT,
+            max_retries=settings.STRIPE_MAX_RETRIES,
+            pool_size=settings.STRIPE_HTTP_POOL_SIZE,
+        )
+
+    def install(self) -> None:
+        stripe.api_key = self.api_key
+        stripe.api_base = self.api_base
+        stripe.default_http_client = self.http_client
+
+    def _options(self, idempotency_key: Optional[str]) -> dict[str, Any]:
+        # A key is fixed per logical call so transport-level retries replay, not repeat, it.
+        return {"api_key": self.api_key, "idempotency_key": idempotency_key or str(uuid.uuid4())}
+
+    def create_checkout_session(self, idempotency_key: Optional[str] = None, **params: Any):
+        return stripe.checkout.Session.create(**self._options(idempotency_key), **params)
+
+    def create_coupon(self, idempotency_key: Optional[str] = None, **params: Any):
+        return stripe.Coupon.create(**self._options(idempotency_key), **params)
+
+    def create_tax_rate(self, idempotency_key: Optional[str] = None, **params: Any):
+        return stripe.TaxRate.create(**self._options(idempotency_key), **params)
+
+
+_client: Optional[StripeClient] = None
+_client_lock = threading.Lock()
+
+
+def get_stripe_client() -> StripeClient:
+    """Return the process-wide client, building and installing it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = StripeClient.from_settings()
+                client.install()
+                _client = client
+    return _client
+
+
+def set_stripe_client(client: Optional[StripeClient]) -> Optional[StripeClient]:
+    """Install ``client`` as the process-wide client and return the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    if client is not None:
+        client.install()
+    return previous
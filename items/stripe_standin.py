@@ -0,0 +1,149 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+
+OBJECT_TYPES = {
+    "/v1/checkout/sessions": ("checkout.session", "cs_test"),
+    "/v1/coupons": ("coupon", "co_test"),
+    "/v1/tax_rates": ("tax_rate", "txr_test"),
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StripeStandIn:
+    """
+    Minimal local HTTP server answering the Stripe endpoints checkout uses.
+
+    Each response is delayed by ``latency`` seconds so benchmarks can model
+    Stripe round trips without the network, and a random ``error_rate``
+    share of requests fails with a Stripe-shaped 500. ``peak_in_flight``
+    records the highest number of requests the server was handling at once.
+    """
+
+    def __init__(self, latency: float = 0.2, host: str = "127.0.0.1", port: int = 0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler_class())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StripeStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StripeStandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle(self, path: str, params: dict) -> tuple[int, dict]:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        if path not in OBJECT_TYPES:
+            return 404, {"error": {"type": "invalid_request_error", "message": f"Unrecognized request URL ({path})"}}
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return 500, {"error": {"type": "api_error", "message": "Injected stand-in failure"}}
+        object_type, prefix = OBJECT_TYPES[path]
+        return 200, {
+            "id": f"{prefix}_{uuid.uuid4().hex}",
+            "object": object_type,
+            "created": int(time.time()),
+            "livemode": False,
+            **params,
+            **self._fields(object_type, params),
+        }
+
+    def _fields(self, object_type: str, params: dict) -> dict:
+        if object_type == "checkout.session":
+            quantities = {k: int(v) for k, v in params.items() if k.endswith("[quantity]")}
+            amount = sum(
+                int(v) * quantities.get(k.split("[price_data]")[0] + "[quantity]", 1)
+                for k, v in params.items() if k.endswith("[price_data][unit_amount]")
+            )
+            return {
+                "status": "open",
+                "payment_status": "unpaid",
+                "amount_subtotal": amount,
+                "amount_total": amount,
+                "currency": params.get("line_items[0][price_data][currency]", "usd"),
+                "expires_at": int(time.time()) + 24 * 3600,
+                "url": f"{self.url}/pay/{uuid.uuid4().hex}",
+            }
+        if object_type == "coupon":
+            return {"valid": True, "times_redeemed": 0}
+        return {"active": True, "inclusive": params.get("inclusive") == "true"}
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                params = dict(parse_qsl(self.rfile.read(length).decode()))
+                status, body = standin.handle(self.path.split("?")[0], params)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+_shared: Optional[StripeStandIn] = None
+_shared_lock = threading.Lock()
+
+
+def shared_standin() -> StripeStandIn:
+    """The process-wide stand-in used when ``STRIPE_FAKE_BACKEND`` is on, started on first use."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = StripeStandIn(
+                    latency=settings.STRIPE_FAKE_LATENCY,
+                    error_rate=settings.STRIPE_FAKE_ERROR_RATE,
+                ).start()
+    return _shared
@@ -0,0 +1,36 @@
+from datetime import timedelta
+from typing import Optional
+
+from .cleanup import purge_stale_orders
+from .jobs import enqueue, job
+from .models import Discount, Tax
+from .utils import create_stripe_coupon, create_stripe_tax_rate, get_or_create_stripe_id
+from .webhooks import process_stripe_events
+
+
+@job("stripe.create_coupon", concurrency=2)
+def create_coupon(discount_id: int) -> None:
+    discount = Discount.objects.filter(id=discount_id, is_active=True).first()
+    if discount is not None:
+        get_or_create_stripe_id(discount, create_stripe_coupon)
+
+
+@job("stripe.create_tax_rate", concurrency=2)
+def create_tax_rate(tax_id: int) -> None:
+    tax = Tax.objects.filter(id=tax_id, is_active=True).first()
+    if tax is not None:
+        get_or_create_stripe_id(tax, create_stripe_tax_rate)
+
+
+@job("stripe.process_events", concurrency=1)
+def process_events(batch_size: int = 500) -> None:
+    while process_stripe_events(batch_size=batch_size):
+        pass
+
+
+@job("orders.purge_stale", concurrency=1)
+def purge_stale(days: float = 30, reschedule: Optional[float] = None) -> None:
+    """Purge stale unpaid orders; with ``reschedule`` seconds, queue the next run."""
+    purge_stale_orders(timedelta(days=days))
+    if reschedule:
+        enqueue("orders.purge_stale", {"days": days, "reschedule": reschedule}, delay=reschedule)
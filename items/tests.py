@@ -1,3 +1,1263 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore as DbSession
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from stripe_app.postgresql_pool.pool import ConnectionPool, PoolTimeout
+
+from . import catalog, db_router, jobs, metrics, page_cache, staticfiles, stripe_async, utils
+from .cart import SessionCart
+from .catalog_import import import_items, read_rows
+from .checkout_sessions import CheckoutSessionBusy, get_or_create_checkout_session
+from .cleanup import purge_stale_orders
+from .management.commands.benchmark import SCENARIOS
+from .management.commands.serve import pending_migrations
+from .models import Discount, Item, Job, Order, OrderItem, StripeEvent, Tax
+from .sessions.cached_db import SessionStore as CachedDbSession
+from .sessions.signed_cookies import SessionStore as SignedCookieSession
+from .stripe_client import RetryingRequestsClient, StripeClient, set_stripe_client
+from .stripe_standin import StripeStandIn
+from .webhooks import process_stripe_events
+
+
+class OrderPricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.console = Item.objects.create(name="Console", price=38900)
+        cls.headphones = Item.objects.create(name="Headphones", price=23000)
+        cls.discount = Discount.objects.create(name="Promo", discount_type=Discount.PERCENTAGE, value=10)
+        cls.tax = Tax.objects.create(name="VAT", percentage=Decimal("20.00"))
+        cls.order = Order.objects.create(discount=cls.discount, tax=cls.tax)
+        OrderItem.objects.create(order=cls.order, item=cls.console, quantity=2)
+        OrderItem.objects.create(order=cls.order, item=cls.headphones, quantity=1)
+
+    def test_totals(self):
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual(order.subtotal, 100800)
+        self.assertEqual(order.discount_amount, 10080)
+        self.assertEqual(order.tax_amount, 18144)
+        self.assertEqual(order.total, 108864)
+
+    def test_stored_totals_need_no_queries(self):
+        order = Order.objects.get(id=self.order.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(order.total_dollars, 1088.64)
+            order.subtotal_dollars
+            order.discount_amount_dollars
+            order.tax_amount_dollars
+
+    def test_snapshot_is_memoized(self):
+        order = Order.objects.select_related("discount", "tax").get(id=self.order.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(order.pricing.total, 108864)
+            self.assertEqual(len(order.pricing.lines), 2)
+
+    def test_invalidate_pricing(self):
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual(order.pricing.subtotal, 100800)
+        OrderItem.objects.filter(order=order, item=self.headphones).delete()
+        self.assertEqual(order.pricing.subtotal, 100800)
+        order.invalidate_pricing()
+        self.assertEqual(order.pricing.subtotal, 77800)
+
+
+class OrderTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.console = Item.objects.create(name="Console", price=38900)
+        cls.headphones = Item.objects.create(name="Headphones", price=23000)
+        cls.discount = Discount.objects.create(name="Promo", discount_type=Discount.FIXED, value=1000)
+        cls.order = Order.objects.create(discount=cls.discount)
+
+    def assertTotals(self, subtotal, total):
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.subtotal, self.order.total), (subtotal, total))
+
+    def test_lines_are_applied_as_deltas(self):
+        line = OrderItem.objects.create(order=self.order, item=self.console)
+        self.assertTotals(38900, 37900)
+        OrderItem.objects.create(order=self.order, item=self.headphones, quantity=2)
+        self.assertTotals(84900, 83900)
+        line.quantity = 3
+        line.save()
+        self.assertTotals(162700, 161700)
+        OrderItem.objects.filter(item=self.headphones).delete()
+        self.assertTotals(116700, 115700)
+        line.delete()
+        self.assertTotals(0, 0)
+
+    def test_discount_and_price_changes_reprice_open_orders(self):
+        OrderItem.objects.create(order=self.order, item=self.console)
+        self.discount.value = 2000
+        self.discount.save()
+        self.assertTotals(38900, 36900)
+        self.console.price = 40000
+        self.console.save()
+        self.assertTotals(40000, 38000)
+
+    def test_deleting_discount_or_tax_reprices_open_orders(self):
+        OrderItem.objects.create(order=self.order, item=self.console)
+        self.order.refresh_from_db()
+        self.order.tax = Tax.objects.create(name="VAT", percentage=Decimal("10.00"))
+        self.order.save()
+        self.assertTotals(38900, 41690)
+        self.discount.delete()
+        self.assertTotals(38900, 42790)
+        self.order.tax.delete()
+        self.assertTotals(38900, 38900)
+
+    def test_paid_orders_keep_their_totals(self):
+        OrderItem.objects.create(order=self.order, item=self.console)
+        order = Order.objects.get(id=self.order.id)
+        order.is_paid = True
+        with self.assertNumQueries(1):  # the UPDATE; discount and tax are not loaded
+            order.save(update_fields=["is_paid"])
+        Discount.objects.filter(id=self.discount.id).update(value=5000)
+        order.subtotal = 1
+        order.save()
+        self.assertTotals(1, 37900)
+
+    def test_unchanged_pricing_is_not_recomputed(self):
+        OrderItem.objects.create(order=self.order, item=self.console)
+        order = Order.objects.get(id=self.order.id)
+        with mock.patch.object(Order, "apply_totals") as apply_totals:
+            order.save()
+            apply_totals.assert_not_called()
+            order.tax = Tax.objects.create(name="VAT", percentage=Decimal("10.00"))
+            order.save()
+            apply_totals.assert_called_once()
+
+    def test_recompute_order_totals_repairs_drift(self):
+        OrderItem.objects.create(order=self.order, item=self.console)
+        Order.objects.filter(id=self.order.id).update(subtotal=1, total=1)
+        out = StringIO()
+        call_command("recompute_order_totals", stdout=out)
+        self.assertIn("1 order(s)", out.getvalue())
+        self.assertTotals(38900, 37900)
+
+
+class CartViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.console = Item.objects.create(name="Console", price=38900)
+        cls.headphones = Item.objects.create(name="Headphones", price=23000)
+        cls.discount = Discount.objects.create(name="Promo", discount_type=Discount.PERCENTAGE, value=10)
+        cls.tax = Tax.objects.create(name="VAT", percentage=Decimal("20.00"))
+        cls.order = Order.objects.create(discount=cls.discount, tax=cls.tax)
+        OrderItem.objects.create(order=cls.order, item=cls.console, quantity=2)
+        OrderItem.objects.create(order=cls.order, item=cls.headphones, quantity=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def _fill_cart(self):
+        self.client.post(reverse("add_to_cart", args=[self.console.id]))
+        self.client.post(reverse("add_to_cart", args=[self.headphones.id]))
+        self.client.post(reverse("change_quantity", args=[self.console.id]), data={"quantity": 2})
+
+    def test_cart_changes_do_not_write_orders(self):
+        orders = Order.objects.count()
+        self._fill_cart()
+        self.client.post(reverse("delete_from_cart", args=[self.headphones.id]))
+        self.assertEqual(Order.objects.count(), orders)
+        self.assertEqual(self.client.session["cart"], {str(self.console.id): 2})
+
+    def test_batch_applies_operations_in_one_request(self):
+        self._fill_cart()
+        operations = [
+            {"op": "increment", "item_id": self.console.id, "by": 3},
+            {"op": "remove", "item_id": self.headphones.id},
+            {"op": "set", "item_id": self.headphones.id, "quantity": 1},
+            {"op": "increment", "item_id": self.headphones.id},
+        ]
+        # items in bulk, write-through of the session (savepoint, UPDATE, release);
+        # the session itself is read from the cache
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                reverse("cart_batch"), {"operations": operations}, content_type="application/json"
+            )
+        data = response.json()
+        self.assertEqual(
+            [(line["item_id"], line["quantity"]) for line in data["lines"]],
+            [(self.console.id, 5), (self.headphones.id, 2)],
+        )
+        self.assertEqual(data["total"], 5 * 38900 + 2 * 23000)
+
+    def test_batch_is_all_or_nothing(self):
+        self._fill_cart()
+        before = self.client.session["cart"]
+        operations = [{"op": "remove", "item_id": self.console.id}, {"op": "set", "item_id": 999, "quantity": 1}]
+        response = self.client.post(reverse("cart_batch"), {"operations": operations}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.session["cart"], before)
+
+    def test_batch_drops_items_deleted_from_catalog(self):
+        cable = Item.objects.create(name="Cable", price=900)
+        self._fill_cart()
+        self.client.post(reverse("add_to_cart", args=[cable.id]))
+        cable.delete()
+        operations = [{"op": "increment", "item_id": self.console.id}]
+        response = self.client.post(reverse("cart_batch"), {"operations": operations}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session["cart"], {str(self.console.id): 3, str(self.headphones.id): 1})
+
+    def test_add_to_cart_increments_existing_line(self):
+        self._fill_cart()
+        response = self.client.post(reverse("add_to_cart", args=[self.console.id]))
+        self.assertEqual(response.json()["quantity"], 3)
+        self.client.post(
+            reverse("change_quantity", args=[self.console.id]), {"delta": -3}, content_type="application/json"
+        )
+        self.assertEqual(self.client.session["cart"], {str(self.headphones.id): 1})
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cache")
+    def test_concurrent_increments_are_not_lost(self):
+        from importlib import import_module
+
+        class SlowStore(import_module(settings.SESSION_ENGINE).SessionStore):
+            # Widen the read-modify-write window so unserialized writers would collide.
+            def load(self):
+                data = super().load()
+                time.sleep(0.002)
+                return data
+
+        session = SlowStore()
+        session.create()
+
+        def add_many(_):
+            for _ in range(10):
+                SessionCart(SlowStore(session.session_key)).increment(self.console.id, 1)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(add_many, range(8)))
+        self.assertEqual(SessionCart(SlowStore(session.session_key)).quantity(self.console.id), 80)
+
+    def test_cart_lock_is_shared_between_workers(self):
+        from django.contrib.sessions.backends.cache import SessionStore as CacheSession
+
+        session = CacheSession()
+        session.create()
+        # A second backend instance on the same location stands in for another worker.
+        other = caches.create_connection("default")
+        self.assertTrue(other.add(f"cart-lock:{session.session_key}", 1))
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(SessionCart(CacheSession(session.session_key)).increment, self.console.id, 1)
+            time.sleep(0.05)
+            self.assertFalse(future.done())
+            other.delete(f"cart-lock:{session.session_key}")
+            self.assertEqual(future.result(timeout=5), 1)
+
+    def test_stuck_cart_lock_answers_409(self):
+        self.client.post(reverse("add_to_cart", args=[self.console.id]))
+        cache.add(f"cart-lock:{self.client.session.session_key}", 1, timeout=60)
+        with override_settings(CART_LOCK_TIMEOUT=0.2):
+            response = self.client.post(reverse("add_to_cart", args=[self.console.id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(SessionCart(self.client.session).quantity(self.console.id), 1)
+
+    def test_cart_page_query_count(self):
+        self._fill_cart()
+        # items in bulk; the session comes from the cache
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("cart_page"))
+        self.assertContains(response, "$1008.0")
+
+    @mock.patch("stripe.checkout.Session.create", return_value=SimpleNamespace(id="cs_cart"))
+    def test_checkout_materializes_cart_once(self, session_create):
+        self._fill_cart()
+        self.assertEqual(self.client.post(reverse("buy_cart")).json(), {"id": "cs_cart"})
+        self.assertEqual(self.client.post(reverse("buy_cart")).json(), {"id": "cs_cart"})
+        order = Order.objects.latest("id")
+        self.assertEqual(Order.objects.filter(id__gt=self.order.id).count(), 1)
+        self.assertEqual(order.total, 100800)
+        self.assertEqual(dict(order.order_items.values_list("item_id", "quantity")), {
+            self.console.id: 2,
+            self.headphones.id: 1,
+        })
+        self.assertEqual(session_create.call_args.kwargs["metadata"], {"order_id": str(order.id)})
+
+        self.client.get(reverse("success"), {"order_id": order.id})
+        # the session is read from the cache and an empty cart needs no lookups
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("cart_page"))
+        self.assertContains(response, "Your cart is empty")
+
+    def test_legacy_order_session_is_imported(self):
+        session = self.client.session
+        session["order_id"] = self.order.id
+        session.save()
+        response = self.client.get(reverse("cart_page"))
+        self.assertContains(response, "$1008.0")
+        self.assertNotIn("order_id", self.client.session)
+
+    @mock.patch("stripe.checkout.Session.create", return_value=SimpleNamespace(id="cs_test"))
+    def test_buy_order_query_count(self, session_create):
+        self.discount.stripe_coupon_id = "coupon_test"
+        self.discount.save()
+        self.tax.stripe_tax_rate_id = "txr_test"
+        self.tax.save()
+        # order with discount/tax, order lines
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse("buy_order", args=[self.order.id]))
+        self.assertEqual(response.json(), {"id": "cs_test"})
+        line_items = session_create.call_args.kwargs["line_items"]
+        self.assertEqual([li["quantity"] for li in line_items], [2, 1])
+
+    def test_admin_changelist_query_count(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(admin)
+        for _ in range(5):
+            order = Order.objects.create(discount=self.discount, tax=self.tax)
+            OrderItem.objects.create(order=order, item=self.console)
+        # user, 2x count, orders with discount/tax
+        with self.assertNumQueries(4):
+            self.client.get(reverse("admin:items_order_changelist"))
+
+    def test_admin_changelist_sorts_and_filters_by_total(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(admin)
+        cheap = Order.objects.create()
+        OrderItem.objects.create(order=cheap, item=Item.objects.create(name="Cable", price=900))
+        url = reverse("admin:items_order_changelist")
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {"o": "-6", "total": "gte500"})
+        self.assertEqual([o.id for o in response.context["cl"].result_list], [self.order.id])
+        response = self.client.get(url, {"o": "6"})
+        self.assertEqual(response.context["cl"].result_list[0].id, cheap.id)
+
+
+class StripeRegistryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Console", price=38900)
+        cls.discount = Discount.objects.create(name="Promo", value=10)
+        cls.tax = Tax.objects.create(name="VAT", percentage=Decimal("20.00"))
+        cls.order = Order.objects.create(discount=cls.discount, tax=cls.tax)
+        OrderItem.objects.create(order=cls.order, item=cls.item)
+
+    def setUp(self):
+        cache.clear()
+        utils._stripe_ids.clear()
+        patcher = mock.patch("stripe.checkout.Session.create", return_value=SimpleNamespace(id="cs_test"))
+        self.session_create = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch("stripe.TaxRate.create", return_value=SimpleNamespace(id="txr_1"))
+    @mock.patch("stripe.Coupon.create", side_effect=[SimpleNamespace(id="co_1"), SimpleNamespace(id="co_2")])
+    def test_objects_are_created_once_per_version(self, coupon_create, tax_rate_create):
+        for _ in range(2):
+            self.client.post(reverse("buy_order", args=[self.order.id]))
+        self.assertEqual(coupon_create.call_count, 1)
+        self.assertEqual(tax_rate_create.call_count, 1)
+        self.assertEqual(coupon_create.call_args.kwargs["idempotency_key"], f"items.discount-{self.discount.id}-v1")
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.stripe_coupon_id, "co_1")
+
+        self.discount.value = 15
+        self.discount.save()
+        self.assertEqual((self.discount.version, self.discount.stripe_coupon_id), (2, None))
+        self.client.post(reverse("buy_order", args=[self.order.id]))
+        self.assertEqual(coupon_create.call_count, 2)
+        self.assertEqual(self.session_create.call_args.kwargs["discounts"], [{"coupon": "co_2"}])
+
+    def test_renaming_keeps_the_stripe_object(self):
+        self.discount.stripe_coupon_id = "co_1"
+        self.discount.save()
+        self.discount.name = "Spring promo"
+        self.discount.save()
+        self.assertEqual((self.discount.version, self.discount.stripe_coupon_id), (1, "co_1"))
+
+
+class AsyncCheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Console", price=38900)
+        cls.order = Order.objects.create()
+        OrderItem.objects.create(order=cls.order, item=cls.item, quantity=2)
+
+    def test_encode_params(self):
+        encoded = list(stripe_async.encode_params({"line_items": [{"price_data": {"unit_amount": 100}, "quantity": 2}]}))
+        self.assertEqual(encoded, [
+            ("line_items[0][price_data][unit_amount]", "100"),
+            ("line_items[0][quantity]", "2"),
+        ])
+
+    @mock.patch("items.views.stripe_async.create_checkout_session", new_callable=mock.AsyncMock)
+    def test_buy_order_async(self, create_session):
+        create_session.return_value = SimpleNamespace(id="cs_async")
+        response = self.client.post(reverse("buy_order_async", args=[self.order.id]))
+        self.assertEqual(response.json(), {"id": "cs_async"})
+        self.assertEqual(create_session.call_args.kwargs["line_items"][0]["quantity"], 2)
+
+
+class StripeClientTests(TestCase):
+    def test_retries_rate_limits_within_budget(self):
+        http_client = RetryingRequestsClient(max_retries=2)
+        self.assertTrue(http_client._should_retry(("", 429, {}), None, 1))
+        self.assertTrue(http_client._should_retry(("", 503, {}), None, 1))
+        self.assertFalse(http_client._should_retry(("", 429, {}), None, 2))
+        self.assertFalse(http_client._should_retry(("", 400, {}), None, 0))
+
+    @mock.patch("stripe.checkout.Session.create")
+    def test_calls_carry_an_idempotency_key(self, session_create):
+        client = StripeClient("sk_test", "https://api.stripe.com", 1, 1, max_retries=2, pool_size=1)
+        client.create_checkout_session(mode="payment")
+        client.create_checkout_session(idempotency_key="fixed", mode="payment")
+        keys = [call.kwargs["idempotency_key"] for call in session_create.call_args_list]
+        self.assertTrue(keys[0])
+        self.assertEqual(keys[1], "fixed")
+
+
+class CheckoutSessionReuseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Console", price=38900)
+        cls.order = Order.objects.create()
+        cls.line = OrderItem.objects.create(order=cls.order, item=cls.item)
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch("stripe.checkout.Session.create", side_effect=[SimpleNamespace(id="cs_1"), SimpleNamespace(id="cs_2")])
+    def test_identical_cart_reuses_open_session(self, session_create):
+        url = reverse("buy_order", args=[self.order.id])
+        self.assertEqual(self.client.post(url).json(), {"id": "cs_1"})
+        self.assertEqual(self.client.post(url).json(), {"id": "cs_1"})
+        self.assertEqual(session_create.call_count, 1)
+
+        self.line.quantity = 2
+        self.line.save()
+        self.assertEqual(self.client.post(url).json(), {"id": "cs_2"})
+
+    @override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+    @mock.patch("stripe.checkout.Session.create", side_effect=[SimpleNamespace(id="cs_1"), SimpleNamespace(id="cs_2")])
+    def test_completed_session_is_not_reused(self, session_create):
+        url = reverse("buy_order", args=[self.order.id])
+        self.assertEqual(self.client.post(url).json(), {"id": "cs_1"})
+        response = post_stripe_event(self.client, "evt_1", self.order.id, session_id="cs_1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post(url).json(), {"id": "cs_2"})
+
+    def test_expired_sessions_are_not_cached(self):
+        expired = SimpleNamespace(id="cs_old", expires_at=time.time() + 60)
+        fresh = SimpleNamespace(id="cs_new")
+        create = mock.Mock(side_effect=[expired, fresh])
+        self.assertEqual(get_or_create_checkout_session("fp", create), "cs_old")
+        self.assertEqual(get_or_create_checkout_session("fp", create), "cs_new")
+
+    def test_concurrent_identical_requests_are_coalesced(self):
+        def create():
+            time.sleep(0.1)
+            return SimpleNamespace(id=f"cs_{create_calls.call_count}")
+
+        create_calls = mock.Mock(side_effect=create)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = list(pool.map(lambda _: get_or_create_checkout_session("fp", create_calls), range(8)))
+        self.assertEqual(create_calls.call_count, 1)
+        self.assertEqual(set(ids), {"cs_1"})
+
+    @override_settings(CHECKOUT_SESSION_LOCK_TIMEOUT=0.2)
+    def test_lock_held_by_another_worker_is_left_alone(self):
+        lock_key = "checkout-session:fp:lock"
+        cache.add(lock_key, 1, timeout=60)
+        create = mock.Mock()
+        with self.assertRaises(CheckoutSessionBusy):
+            get_or_create_checkout_session("fp", create)
+        create.assert_not_called()
+        self.assertTrue(cache.has_key(lock_key))
+
+    @mock.patch("items.views.get_or_create_checkout_session", side_effect=CheckoutSessionBusy("busy"))
+    def test_busy_checkout_answers_503(self, get_or_create):
+        self.assertEqual(self.client.post(reverse("buy_order", args=[self.order.id])).status_code, 503)
+
+
+def post_stripe_event(client, event_id, order_id, event_type="checkout.session.completed", secret="whsec_test", session_id=None):
+    payload = json.dumps({
+        "id": event_id,
+        "object": "event",
+        "type": event_type,
+        "data": {"object": {"id": session_id, "payment_status": "paid", "metadata": {"order_id": str(order_id)}}},
+    })
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return client.post(
+        reverse("stripe_webhook"),
+        data=payload,
+        content_type="application/json",
+        HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+    )
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class StripeWebhookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.order = Order.objects.create()
+
+    def test_events_are_stored_once_and_processed_in_batches(self):
+        # event insert, pending-job check, job insert
+        with self.assertNumQueries(3):
+            self.assertEqual(post_stripe_event(self.client, "evt_1", self.order.id).status_code, 200)
+        self.assertEqual(post_stripe_event(self.client, "evt_1", self.order.id).status_code, 200)
+        post_stripe_event(self.client, "evt_2", self.order.id, event_type="checkout.session.expired")
+        self.assertEqual(StripeEvent.objects.count(), 2)
+        self.assertEqual(Job.objects.filter(type="stripe.process_events").count(), 1)
+        self.assertFalse(Order.objects.get(id=self.order.id).is_paid)
+
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertTrue(Order.objects.get(id=self.order.id).is_paid)
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(process_stripe_events(), 0)
+
+    def test_rejects_bad_signature(self):
+        self.assertEqual(post_stripe_event(self.client, "evt_1", self.order.id, secret="whsec_other").status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_success_page_does_not_mark_order_paid(self):
+        self.client.get(reverse("success"), {"order_id": self.order.id})
+        self.assertFalse(Order.objects.get(id=self.order.id).is_paid)
+
+
+@override_settings(JOB_RETRY_BASE_DELAY=0, JOB_RETRY_MAX_DELAY=0)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = Counter()
+        registry = dict(jobs.registry)
+        self.addCleanup(lambda: (jobs.registry.clear(), jobs.registry.update(registry)))
+
+        @jobs.job("test.flaky", max_attempts=3)
+        def flaky(name, fail_times):
+            self.calls[name] += 1
+            if self.calls[name] <= fail_times:
+                raise RuntimeError("boom")
+
+        @jobs.job("test.limited", concurrency=1)
+        def limited():
+            pass
+
+    def test_failed_jobs_are_retried_then_dead_lettered(self):
+        retried = jobs.enqueue("test.flaky", {"name": "retried", "fail_times": 1})
+        dead = jobs.enqueue("test.flaky", {"name": "dead", "fail_times": 10})
+        with self.assertLogs("items.jobs", "ERROR"):
+            jobs.run_pending()
+        retried.refresh_from_db()
+        dead.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts), (Job.DONE, 2))
+        self.assertEqual((dead.status, dead.attempts), (Job.DEAD, 3))
+        self.assertIn("RuntimeError: boom", dead.last_error)
+
+    def test_concurrency_limit_per_type(self):
+        first = jobs.enqueue("test.limited")
+        jobs.enqueue("test.limited")
+        self.assertEqual(jobs.claim("w1").id, first.id)
+        self.assertIsNone(jobs.claim("w2"))
+
+    def test_concurrency_limit_holds_when_counts_were_read_before_a_claim(self):
+        jobs.enqueue("test.limited")
+        jobs.enqueue("test.limited")
+        # Both workers read the running counts before either claimed a job.
+        pending = Job.objects.filter(status=Job.PENDING).order_by("id")
+        with mock.patch("items.jobs._claimable", side_effect=lambda types, exclude=(): pending.all()):
+            self.assertIsNotNone(jobs.claim("w1"))
+            self.assertIsNone(jobs.claim("w2"))
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING).count(), 1)
+
+    def test_discount_creation_enqueues_coupon_job(self):
+        discount = Discount.objects.create(name="Promo", value=10)
+        with mock.patch("stripe.Coupon.create", return_value=SimpleNamespace(id="co_job")):
+            self.assertEqual(jobs.run_pending(types=["stripe.create_coupon"]), 1)
+        discount.refresh_from_db()
+        self.assertEqual(discount.stripe_coupon_id, "co_job")
+
+
+class PurgeStaleOrdersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        item = Item.objects.create(name="Console", price=38900)
+        old = timezone.now() - timedelta(days=40)
+        cls.stale = [Order.objects.create() for _ in range(5)]
+        cls.paid = Order.objects.create(is_paid=True)
+        cls.fresh = Order.objects.create()
+        for order in [*cls.stale, cls.paid, cls.fresh]:
+            OrderItem.objects.create(order=order, item=item)
+        Order.objects.exclude(id=cls.fresh.id).update(created_at=old)
+
+    def test_dry_run_only_counts(self):
+        out = StringIO()
+        call_command("purge_stale_orders", "--dry-run", stdout=out)
+        self.assertIn("would delete 5 orders and 5 lines", out.getvalue())
+        self.assertEqual(Order.objects.count(), 7)
+
+    def test_deletes_stale_unpaid_orders_in_batches(self):
+        batches = []
+        result = purge_stale_orders(timedelta(days=30), batch_size=2, pause=0, on_batch=lambda r: batches.append(r.orders))
+        self.assertEqual((result.orders, result.order_items, result.batches), (5, 5, 3))
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual(set(Order.objects.values_list("id", flat=True)), {self.paid.id, self.fresh.id})
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+    def test_purge_does_not_reprice_deleted_orders(self):
+        with mock.patch.object(Order, "add_to_subtotal") as add_to_subtotal:
+            purge_stale_orders(timedelta(days=30), pause=0)
+        add_to_subtotal.assert_not_called()
+
+
+class ItemPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Camera", description="Mirrorless", price=129900)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_page_is_served_without_queries(self):
+        url = reverse("item_page", args=[self.item.id])
+        first = self.client.get(url)
+        self.assertContains(first, "Camera")
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(page_cache.stats(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_saving_or_deleting_item_invalidates_page(self):
+        url = reverse("item_page", args=[self.item.id])
+        self.client.get(url)
+        self.item.name = "Camera II"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save()
+        self.assertContains(self.client.get(url), "Camera II")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_item_is_invalidated_only_after_commit(self):
+        self.client.get(reverse("item_page", args=[self.item.id]))
+        key = page_cache.page_key(self.item.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.item.name = "Camera II"
+                self.item.save()
+                # A miss now would re-cache the row as last committed.
+                self.assertIsNotNone(cache.get(key, version=settings.ITEM_CACHE_VERSION))
+            self.assertIsNotNone(cache.get(key, version=settings.ITEM_CACHE_VERSION))
+        self.assertIsNone(cache.get(key, version=settings.ITEM_CACHE_VERSION))
+
+    def test_warm_command_prefills_cache(self):
+        call_command("warm_item_cache", stdout=StringIO())
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(reverse("item_page", args=[self.item.id])), "Mirrorless")
+
+    def test_cache_is_shared_between_workers(self):
+        # A second backend instance on the same location stands in for another worker.
+        other = caches.create_connection("default")
+        page_cache.warm(self.item)
+        version = settings.ITEM_CACHE_VERSION
+        self.assertIsNotNone(other.get(page_cache.page_key(self.item.id), version=version))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save()
+        self.assertIsNone(other.get(page_cache.page_key(self.item.id), version=version))
+
+        self.assertTrue(cache.add("lock", 1))
+        self.assertFalse(other.add("lock", 1))
+        cache.delete("lock")
+        self.assertTrue(other.add("lock", 1))
+
+    @mock.patch("items.views.get_stripe_client")
+    def test_buy_item_charges_current_price(self, get_client):
+        get_client.return_value.create_checkout_session.return_value = SimpleNamespace(id="cs_fresh")
+        page_cache.warm(self.item)
+        # Bypasses the signals, as a write from another host's cache would look.
+        Item.objects.filter(id=self.item.id).update(price=99900)
+        self.client.post(reverse("buy_item", args=[self.item.id]))
+        line_items = get_client.return_value.create_checkout_session.call_args.kwargs["line_items"]
+        self.assertEqual(line_items[0]["price_data"]["unit_amount"], 99900)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Tripod", price=4900)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_item_page_answers_304_for_matching_validators(self):
+        url = reverse("item_page", args=[self.item.id])
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(since.status_code, 304)
+
+        self.item.price = 5900
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save(update_fields=["price"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+    def test_deploy_changes_item_validators(self):
+        url = reverse("item_page", args=[self.item.id])
+        first = self.client.get(url)
+        deployed = ("next-release", timezone.now() + timedelta(minutes=1))
+        with mock.patch("items.page_cache._release", return_value=deployed):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 200)
+
+    def test_cart_etag_follows_cart_contents(self):
+        self.client.post(reverse("add_to_cart", args=[self.item.id]))
+        first = self.client.get(reverse("cart_page"))
+        self.assertEqual(self.client.get(reverse("cart_page"), HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        self.client.post(reverse("change_quantity", args=[self.item.id]), {"quantity": 3})
+        changed = self.client.get(reverse("cart_page"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn("private", changed["Cache-Control"])
+
+    def test_deploy_changes_cart_etag(self):
+        self.client.post(reverse("add_to_cart", args=[self.item.id]))
+        first = self.client.get(reverse("cart_page"))
+        deployed = ("next-release", timezone.now() + timedelta(minutes=1))
+        with mock.patch("items.page_cache._release", return_value=deployed):
+            self.assertEqual(self.client.get(reverse("cart_page"), HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+
+class ImportItemsTests(TestCase):
+    CSV = (
+        "sku,name,description,price\n"
+        "SKU-1,Drone,Quadcopter,49900\n"
+        "SKU-2,Gimbal,,12900\n"
+        ",Nameless,,100\n"
+        "SKU-3,Lens,Prime lens,abc\n"
+        "SKU-4,Filter,,1500\n"
+    )
+
+    def test_csv_import_upserts_by_sku(self):
+        existing = Item.objects.create(sku="SKU-2", name="Old gimbal", price=9900)
+        order = Order.objects.create()
+        OrderItem.objects.create(order=order, item=existing, quantity=2)
+
+        out = StringIO()
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(self.CSV)
+        self.addCleanup(os.remove, f.name)
+        call_command("import_items", f.name, "--batch-size", "2", stdout=out)
+
+        self.assertIn("5 rows (2 created, 1 updated, 2 skipped)", out.getvalue())
+        self.assertEqual(Item.objects.get(sku="SKU-2").name, "Gimbal")
+        self.assertEqual(set(Item.objects.values_list("sku", flat=True)), {"SKU-1", "SKU-2", "SKU-4"})
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, 2 * 12900)
+
+    def test_import_drops_pages_cached_by_other_workers(self):
+        item = Item.objects.create(sku="SKU-1", name="Old drone", price=100)
+        # A second backend instance on the same location stands in for a web worker.
+        worker_cache = caches.create_connection("default")
+        page_cache.warm(item)
+        key = page_cache.page_key(item.id)
+        self.assertIsNotNone(worker_cache.get(key, version=settings.ITEM_CACHE_VERSION))
+        with self.captureOnCommitCallbacks(execute=True):
+            import_items(read_rows(StringIO(self.CSV), "csv"))
+        self.assertIsNone(worker_cache.get(key, version=settings.ITEM_CACHE_VERSION))
+
+    def test_resumes_from_checkpoint(self):
+        lines = [json.dumps({"sku": f"S{i}", "name": f"Item {i}", "price": i}) for i in range(5)]
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = os.path.join(tmp, "import.checkpoint")
+            with open(checkpoint, "w") as f:
+                f.write("3")
+            result = import_items(read_rows(StringIO("\n".join(lines)), "jsonl"), batch_size=10, checkpoint=checkpoint)
+            with open(checkpoint) as f:
+                self.assertEqual(f.read(), "5")
+
+        self.assertEqual((result.rows, result.created), (5, 2))
+        self.assertEqual(set(Item.objects.values_list("sku", flat=True)), {"S3", "S4"})
+
+    def test_malformed_jsonl_lines_are_skipped(self):
+        lines = [
+            json.dumps({"sku": "S1", "name": "Item 1", "price": 100}),
+            '{"sku": "S2", "na',
+            "[1, 2]",
+            json.dumps({"sku": "S3", "name": "Item 3", "price": 300}),
+        ]
+        result = import_items(read_rows(StringIO("\n".join(lines)), "jsonl"), batch_size=10)
+        self.assertEqual((result.rows, result.created, result.skipped), (4, 2, 2))
+
+
+class CatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Item.objects.bulk_create(
+            Item(name=f"Item {i:02}", description="red" if i % 2 else "blue", price=1000 * (i % 4))
+            for i in range(10)
+        )
+
+    def collect(self, **params):
+        seen, cursor = [], None
+        while True:
+            data = self.client.get(reverse("catalog_json"), {**params, **({"cursor": cursor} if cursor else {})}).json()
+            seen.extend((item["price"], item["id"]) for item in data["items"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                return seen
+
+    def test_keyset_pages_cover_catalog_in_order(self):
+        expected = list(Item.objects.order_by("price", "id").values_list("price", "id"))
+        self.assertEqual(self.collect(sort="price", limit=3), expected)
+        self.assertEqual(self.collect(sort="-price", limit=4), expected[::-1])
+
+    def test_deep_page_is_a_single_bounded_query(self):
+        cursor = catalog.encode_cursor(2000, Item.objects.filter(price=2000).order_by("id").first().id)
+        with self.assertNumQueries(1) as ctx:
+            self.client.get(reverse("catalog_json"), {"sort": "price", "cursor": cursor, "limit": 2})
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertNotIn("OFFSET", sql)
+        self.assertIn("LIMIT 3", sql)
+
+    def test_search_and_html_page(self):
+        data = self.client.get(reverse("catalog_json"), {"q": "RED", "limit": 100}).json()
+        self.assertEqual(len(data["items"]), 5)
+        response = self.client.get(reverse("catalog"), {"q": "blue", "limit": 2})
+        self.assertContains(response, "Next page")
+        self.assertEqual(self.client.get(reverse("catalog_json"), {"cursor": "%%%"}).status_code, 400)
+
+    def test_cursor_of_the_wrong_type_is_rejected(self):
+        for sort, value in (("price", [1]), ("price", "100"), ("price", True), ("name", 5)):
+            cursor = catalog.encode_cursor(value, 1)
+            response = self.client.get(reverse("catalog_json"), {"sort": sort, "cursor": cursor})
+            self.assertEqual(response.status_code, 400, (sort, value))
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name="Speaker", price=15900)
+
+    def setUp(self):
+        cache.clear()
+        metrics.store.reset()
+
+    def scrape(self) -> dict[str, float]:
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        return {
+            name: float(value)
+            for name, value in (line.rsplit(" ", 1) for line in response.content.decode().splitlines())
+            if not name.startswith("#")
+        }
+
+    def test_records_latency_sql_and_render_per_view(self):
+        self.client.get(reverse("item_page", args=[self.item.id]))
+        self.client.get(reverse("item_page", args=[self.item.id]))
+        samples = self.scrape()
+        self.assertEqual(samples['app_request_duration_seconds_count{view="item_page"}'], 2)
+        self.assertEqual(samples['app_request_duration_seconds_bucket{view="item_page",le="+Inf"}'], 2)
+        # the first request misses the page cache and loads the item; the second is served from cache
+        self.assertEqual(samples['app_sql_queries_total{view="item_page"}'], 1)
+        self.assertGreater(samples['app_template_render_seconds_total{view="item_page"}'], 0)
+
+    def test_records_stripe_calls(self):
+        with StripeStandIn(latency=0) as standin, override_settings(STRIPE_API_BASE=standin.url):
+            previous = set_stripe_client(StripeClient("sk_test", standin.url, 1, 1, max_retries=0, pool_size=1))
+            try:
+                self.client.post(reverse("buy_item", args=[self.item.id]))
+            finally:
+                set_stripe_client(previous)
+        samples = self.scrape()
+        self.assertEqual(samples['app_stripe_request_duration_seconds_count{view="buy_item"}'], 1)
+
+    async def test_async_requests_run_concurrently(self):
+        async def create_session(**params):
+            await asyncio.sleep(0.3)
+            metrics.record_stripe_call(0.3)
+            return SimpleNamespace(id="cs_async")
+
+        url = reverse("buy_item_async", args=[self.item.id])
+        with mock.patch("items.views.stripe_async.create_checkout_session", create_session):
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(self.async_client.post(url) for _ in range(4)))
+            elapsed = time.perf_counter() - started
+        self.assertEqual([r.status_code for r in responses], [200] * 4)
+        # Serialized through one thread, four calls would take at least 1.2s.
+        self.assertLess(elapsed, 0.9)
+        body = (await self.async_client.get(reverse("metrics"))).content.decode()
+        self.assertIn('app_stripe_request_duration_seconds_count{view="buy_item_async"} 4', body)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_protects_endpoint(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+class BenchmarkTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fake_backend_is_switched_in_by_settings(self):
+        with override_settings(STRIPE_FAKE_BACKEND=True, STRIPE_FAKE_LATENCY=0):
+            client = StripeClient.from_settings()
+        self.assertTrue(client.api_base.startswith("http://127.0.0.1:"))
+        self.addCleanup(set_stripe_client, set_stripe_client(client))
+        session = client.create_checkout_session(
+            mode="payment",
+            line_items=[{"price_data": {"currency": "usd", "unit_amount": 1500, "product_data": {"name": "Cable"}}, "quantity": 2}],
+            success_url="http://testserver/success.html",
+        )
+        self.assertTrue(session.id.startswith("cs_test_"))
+        self.assertEqual((session.status, session.amount_total), ("open", 3000))
+
+    def test_benchmark_writes_json_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "bench.json")
+            call_command(
+                "benchmark", "--items", "5", "--orders", "3", "--requests", "6", "--clients", "2",
+                "--latency", "0", "--output", output, stdout=StringIO(),
+            )
+            with open(output) as f:
+                report = json.load(f)
+
+        self.assertEqual(set(report["results"]) - {"stripe"}, set(SCENARIOS))
+        for scenario in SCENARIOS:
+            result = report["results"][scenario]
+            self.assertEqual((result["requests"], result["errors"]), (6, 0))
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertFalse(Item.objects.filter(sku__startswith="bench-").exists())
+
+
+class ServeTests(TestCase):
+    def test_migration_check_is_cheap_and_empty_when_current(self):
+        # table introspection and one read of django_migrations
+        with self.assertNumQueries(2):
+            self.assertEqual(pending_migrations(), [])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+    def make_pool(self, **options):
+        return ConnectionPool(check=lambda conn: conn.alive, **{"timeout": 0.05, **options})
+
+    def test_released_connection_is_reused(self):
+        pool = self.make_pool(size=2)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        self.assertIs(pool.acquire(FakeConnection), conn)
+        self.assertEqual((pool.opened, pool.reused), (1, 1))
+
+    def test_overflow_is_closed_on_release_and_timeout_when_exhausted(self):
+        pool = self.make_pool(size=1, max_overflow=1)
+        first, second = pool.acquire(FakeConnection), pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        pool.release(first)
+        pool.release(second)
+        self.assertEqual((first.closed, second.closed), (False, True))
+        self.assertEqual((pool.idle_connections, pool.open_connections), (1, 1))
+
+    def test_expired_and_unhealthy_connections_are_replaced(self):
+        pool = self.make_pool(max_lifetime=0)
+        old = pool.acquire(FakeConnection)
+        pool.release(old)
+        self.assertTrue(old.closed)
+
+        pool = self.make_pool(health_check_after=0)
+        dead = pool.acquire(FakeConnection)
+        pool.release(dead)
+        dead.alive = False
+        fresh = pool.acquire(FakeConnection)
+        self.assertIsNot(fresh, dead)
+        self.assertTrue(dead.closed)
+        self.assertEqual((pool.opened, pool.discarded), (2, 1))
+
+    def test_connection_that_cannot_be_reset_is_discarded(self):
+        pool = self.make_pool(reset=lambda conn: False)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.idle_connections, 0)
+
+    def test_child_process_does_not_reuse_parent_connections(self):
+        pool = self.make_pool()
+        parent = pool.acquire(FakeConnection)
+        pool.release(parent)
+        with mock.patch("stripe_app.postgresql_pool.pool.os.getpid", return_value=os.getpid() + 1):
+            self.assertIsNot(pool.acquire(FakeConnection), parent)
+        self.assertFalse(parent.closed)
+
+    def test_benchmark_shows_connections_saved_by_persistence(self):
+        out = StringIO()
+        call_command(
+            "bench_db_connections", "--requests", "6", "--threads", "2", "--mode", "none", "--mode", "persistent",
+            stdout=out,
+        )
+        self.assertIn("persistent: 6 req", out.getvalue())
+        self.assertRegex(out.getvalue(), r"persistent: .* 2 connects")
+
+
+class SessionBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.console = Item.objects.create(name="Console", price=38900)
+
+    def test_unchanged_session_is_not_saved(self):
+        session = CachedDbSession()
+        session["cart"] = {"1": 2}
+        session.set_expiry(timezone.now() + timedelta(days=1))
+        session.save()
+        loaded = CachedDbSession(session.session_key)
+        with self.assertNumQueries(0):
+            loaded["cart"] = {"1": 2}
+            loaded.save()
+        loaded["cart"] = {"1": 3}
+        # savepoint, UPDATE, release
+        with self.assertNumQueries(3):
+            loaded.save()
+
+    def test_unchanged_session_still_refreshes_age_based_expiry(self):
+        session = CachedDbSession()
+        session["cart"] = {"1": 2}
+        session.save()
+        DbSession.get_model_class().objects.update(expire_date=timezone.now() + timedelta(minutes=1))
+        loaded = CachedDbSession(session.session_key)
+        loaded["cart"] = {"1": 2}
+        loaded.save()
+        stored = DbSession.get_model_class().objects.get().expire_date
+        self.assertGreater(stored, timezone.now() + timedelta(days=1))
+
+    def test_sessions_survive_switching_engines(self):
+        database = DbSession()
+        database["cart"] = {"1": 2}
+        database.save()
+        cookie = SignedCookieSession(database.session_key)
+        self.assertEqual(cookie["cart"], {"1": 2})
+
+        cookie.save()
+        cached = CachedDbSession(cookie.session_key)
+        self.assertEqual(cached["cart"], {"1": 2})
+        self.assertIsNone(cached.session_key)
+        self.assertTrue(cached.modified)
+
+    @override_settings(SESSION_ENGINE="items.sessions.signed_cookies")
+    def test_cart_in_signed_cookie_needs_no_session_table(self):
+        self.client.post(reverse("add_to_cart", args=[self.console.id]))
+        response = self.client.post(reverse("add_to_cart", args=[self.console.id]))
+        self.assertEqual(response.json()["quantity"], 2)
+        # items in bulk only
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("cart_page"))
+        self.assertContains(response, "Console")
+
+
+class StaticAssetTests(TestCase):
+    def test_pages_link_assets_instead_of_inlining_them(self):
+        item = Item.objects.create(name="Console", price=38900)
+        response = self.client.get(reverse("item_page", args=[item.id]))
+        self.assertNotContains(response, "<style>")
+        self.assertContains(response, "items/css/item")
+        self.assertContains(response, f'data-item-id="{item.id}"')
+
+    def test_collected_assets_are_served_precompressed_and_immutable(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            call_command("collectstatic", interactive=False, verbosity=0, ignore_patterns=["admin"])
+            self.assertTrue(os.path.exists(os.path.join(root, "items", "css", "item.css.gz")))
+            from django.templatetags.static import static
+
+            url = static("items/css/item.css")
+            self.assertNotEqual(url, "/static/items/css/item.css")
+
+            client = self.client_class()
+            response = client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+            self.assertEqual(response["Content-Encoding"], "br" if staticfiles.brotli else "gzip")
+            self.assertEqual(response["Cache-Control"], staticfiles.IMMUTABLE)
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+            b"".join(response.streaming_content)
+
+            response = client.get(url, HTTP_ACCEPT_ENCODING="identity")
+            self.assertFalse(response.has_header("Content-Encoding"))
+            self.assertIn(b"box-sizing", b"".join(response.streaming_content))
+
+            self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH="*").status_code, 304)
+            response = client.get("/static/items/css/item.css")
+            self.assertEqual(response["Cache-Control"], "public, max-age=60")
+            b"".join(response.streaming_content)
+
+    async def test_middleware_serves_async_requests(self):
+        async def view(request):
+            return HttpResponse("view")
+
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            os.makedirs(os.path.join(root, "items"))
+            with open(os.path.join(root, "items", "app.js"), "w") as f:
+                f.write("console.log(1);")
+            middleware = staticfiles.StaticFilesMiddleware(view)
+            self.assertTrue(iscoroutinefunction(middleware))
+            response = await middleware(RequestFactory().get("/static/items/app.js"))
+            self.assertEqual(b"".join(response.streaming_content), b"console.log(1);")
+            # Not through the test client: close() would end the test's DB connection.
+            response.file_to_stream.close()
+            response = await middleware(RequestFactory().get("/static/items/missing.js"))
+            self.assertEqual(response.content, b"view")
+
+
+@override_settings(DB_REPLICA_STICKY_SECONDS=30)
+class ReplicaRouterTests(TransactionTestCase):
+    """A second SQLite file stands in for the replica; nothing replicates into it."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test case has set up its databases, so it is left alone by it.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        replica = {"ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(cls.replica_dir.name, "replica.sqlite3")}
+        connections.settings["replica"] = connections.configure_settings({**connections.settings, "replica": replica})["replica"]
+        call_command("migrate", database="replica", verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.item = Item.objects.create(name="Console", price=38900)
+        self.addCleanup(call_command, "flush", database="replica", interactive=False, verbosity=0)
+
+    def catalog_names(self):
+        return [item["name"] for item in self.client.get(reverse("catalog_json")).json()["items"]]
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.catalog_names(), [])
+        Item.objects.using("replica").create(name="Console", price=38900)
+        self.assertEqual(self.catalog_names(), ["Console"])
+        self.assertNotIn(db_router.PIN_COOKIE, self.client.cookies)
+
+    def test_client_that_wrote_reads_from_primary(self):
+        response = self.client.post(reverse("add_to_cart", args=[self.item.id]))
+        self.assertEqual(response.json()["quantity"], 1)
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.catalog_names(), ["Console"])
+
+        self.client.cookies[db_router.PIN_COOKIE] = str(int(time.time()) - 1)
+        self.assertEqual(self.catalog_names(), [])
+
+    def test_outside_requests_reads_use_primary_unless_asked(self):
+        self.assertTrue(Item.objects.exists())
+        with db_router.replica_reads():
+            self.assertFalse(Item.objects.exists())
+            # Any write sends the rest of the block back to the primary.
+            Item.objects.create(name="Cable", price=900)
+            self.assertEqual(Item.objects.count(), 2)
+
+    async def test_async_views_see_routing_and_pin_after_write(self):
+        seen = []
+
+        async def view(request):
+            seen.append(db_router._reads_from.get())
+            if request.method == "POST":
+                await Item.objects.acreate(name="Cable", price=900)
+            return HttpResponse()
+
+        middleware = db_router.ReplicaRouterMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get("/"))
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+        response = await middleware(RequestFactory().post("/"))
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.assertEqual(seen, ["replica", None])
+        self.assertEqual(await Item.objects.acount(), 2)
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        discount = Discount.objects.create(name="Promo", discount_type=Discount.PERCENTAGE, value=10)
+        tax = Tax.objects.create(name="VAT", percentage=Decimal("20.00"))
+        console = Item.objects.create(name="Console", price=38900)
+        cable = Item.objects.create(name="Cable", price=900)
+        cls.january = Order.objects.create(discount=discount, tax=tax)
+        OrderItem.objects.create(order=cls.january, item=console, quantity=2)
+        OrderItem.objects.create(order=cls.january, item=cable, quantity=3)
+        cls.february = Order.objects.create()
+        OrderItem.objects.create(order=cls.february, item=cable)
+        unpaid = Order.objects.create()
+        OrderItem.objects.create(order=unpaid, item=console)
+        for order, day in ((cls.january, 10), (cls.february, 40), (unpaid, 20)):
+            Order.objects.filter(id=order.id).update(
+                is_paid=order != unpaid, created_at=timezone.make_aware(datetime(2026, 1, 1)) + timedelta(days=day)
+            )
+        cls.january.refresh_from_db()
+
+    def test_command_streams_paid_orders_in_range_as_csv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "orders.csv")
+            out = StringIO()
+            # one query however many rows: the cursor is read chunk by chunk
+            with self.assertNumQueries(1):
+                call_command(
+                    "export_orders", "--since", "2026-01-01", "--until", "2026-02-01",
+                    "--chunk-size", "1", "--output", output, stdout=out,
+                )
+            with open(output, newline="") as f:
+                rows = list(read_rows(f, "csv"))
+
+        self.assertIn("Exported 1 orders", out.getvalue())
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual((row["id"], row["lines"], row["quantity"]), (str(self.january.id), "2", "5"))
+        self.assertEqual((row["discount"], row["tax"]), ("Promo", "VAT"))
+        self.assertEqual(
+            [int(row[field]) for field in ("subtotal", "discount_amount", "tax_amount", "total")],
+            [self.january.subtotal, self.january.discount_amount, self.january.tax_amount, self.january.total],
+        )
+
+    def test_command_writes_jsonl_to_stdout(self):
+        out = StringIO()
+        call_command("export_orders", "--format", "jsonl", stdout=out)
+        rows = list(read_rows(StringIO(out.getvalue()), "jsonl"))
+        self.assertEqual([row["id"] for row in rows], [self.january.id, self.february.id])
+        self.assertEqual((rows[1]["discount"], rows[1]["total"]), (None, 900))
+
+    def test_admin_action_streams_selected_paid_orders(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(admin)
+        response = self.client.post(reverse("admin:items_order_changelist"), {
+            "action": "export_csv",
+            "_selected_action": [order.id for order in Order.objects.all()],
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(read_rows(StringIO(b"".join(response.streaming_content).decode()), "csv"))
+        self.assertEqual([int(row["id"]) for row in rows], [self.january.id, self.february.id])
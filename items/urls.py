@@ -2,13 +2,21 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
+    path('catalog/', views.catalog_page, name='catalog'),
+    path('catalog.json', views.catalog_json, name='catalog_json'),
     path('items/<int:item_id>/', views.item_page, name='item_page'),
+    path('stats/item-cache/', views.item_cache_stats, name='item_cache_stats'),
     path('buy/<int:item_id>/', views.buy_item, name='buy_item'),
     path('add-to-cart/<int:item_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/', views.cart_page, name='cart_page'),
-    path('cart/change/<int:order_id>/<int:item_id>/', views.change_quantity, name='change_quantity'),
-    path('cart/delete/<int:order_id>/<int:item_id>/', views.delete_item, name='delete_from_cart'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
+    path('cart/change/<int:item_id>/', views.change_quantity, name='change_quantity'),
+    path('cart/delete/<int:item_id>/', views.delete_item, name='delete_from_cart'),
+    path('buy-order/', views.buy_order, name='buy_cart'),
     path('buy-order/<int:order_id>/', views.buy_order, name='buy_order'),
+    path('async/buy/<int:item_id>/', views.buy_item_async, name='buy_item_async'),
+    path('async/buy-order/<int:order_id>/', views.buy_order_async, name='buy_order_async'),
+    path('stripe/webhook/', views.stripe_webhook, name='stripe_webhook'),
     path('success.html', views.success_page, name='success'),
     path('cancel.html', views.cancel_page, name='cancel'),
 ]
\ No newline at end of file
@@ -1,31 +1,44 @@
-from typing import Optional, Dict, Any
-from django.http import HttpRequest
-import stripe
+import threading
+from typing import Optional, Dict, Any, Callable
+from django.db import transaction
 
-from .models import Order
+from .models import Discount, Item, Order, StripeVersionedModel, Tax
+from .stripe_client import get_stripe_client
 
 
-def get_order_from_session(request: HttpRequest) -> Optional[Order]:
-    order_id = request.session.get("order_id")
-    if not order_id:
-        return None
-    
-    try:
-        return Order.objects.get(id=order_id)
-    except Order.DoesNotExist:
-        return None
+def build_item_line_items(item: Item) -> list[Dict[str, Any]]:
+    return [{
+        'price_data': {
+            'currency': 'usd',
+            'unit_amount': item.price,
+            'product_data': {
+                'name': item.name,
+                'description': item.description,
+            },
+        },
+        'quantity': 1,
+    }]
 
 
-def create_order_and_save_to_session(request: HttpRequest) -> Order:
-    order = Order.objects.create()
-    request.session["order_id"] = order.id
-    request.session.modified = True
-    return order
+def build_order_session_params(order: Order, success_url: str, cancel_url: str) -> Dict[str, Any]:
+    line_items = build_line_items(order)
+    session_params = {
+        'payment_method_types': ['card'],
+        'line_items': line_items,
+        'mode': 'payment',
+        'success_url': success_url,
+        'cancel_url': cancel_url,
+        'client_reference_id': str(order.id),
+        'metadata': {'order_id': str(order.id)},
+    }
+    apply_discount_to_session(order, session_params)
+    apply_tax_to_line_items(order, line_items)
+    return session_params
 
 
 def build_line_items(order: Order) -> list[Dict[str, Any]]:
     line_items = []
-    for oi in order.order_items.select_related('item').all():
+    for oi in order.pricing.lines:
         line_items.append({
             'price_data': {
                 'currency': 'usd',
@@ -40,45 +53,96 @@ def build_line_items(order: Order) -> list[Dict[str, Any]]:
     return line_items
 
 
+_stripe_ids: Dict[tuple[str, int, int], str] = {}
+_stripe_ids_lock = threading.Lock()
+_stripe_key_locks: Dict[tuple[str, int, int], threading.Lock] = {}
+
+
+def get_or_create_stripe_id(
+    obj: StripeVersionedModel,
+    create: Callable[[StripeVersionedModel, str], Any],
+) -> str:
+    """
+    Return the Stripe object id for ``obj``'s current version, creating it at most once.
+
+    The id is cached per process by (model, pk, version) and persisted under a
+    row lock. The Stripe call carries an idempotency key derived from the same
+    triple, so racing first uses across processes resolve to a single object.
+    """
+    stripe_id = getattr(obj, obj.STRIPE_ID_FIELD)
+    if stripe_id:
+        return stripe_id
+
+    key = (obj._meta.label_lower, obj.pk, obj.version)
+    if key in _stripe_ids:
+        return _stripe_ids[key]
+
+    with _stripe_ids_lock:
+        key_lock = _stripe_key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        if key in _stripe_ids:
+            return _stripe_ids[key]
+
+        model = type(obj)
+        with transaction.atomic():
+            locked = model.objects.select_for_update().get(pk=obj.pk)
+            stripe_id = getattr(locked, obj.STRIPE_ID_FIELD)
+            if not stripe_id:
+                idempotency_key = f"{key[0]}-{key[1]}-v{locked.version}"
+                stripe_id = create(locked, idempotency_key).id
+                model.objects.filter(pk=obj.pk, version=locked.version).update(
+                    **{obj.STRIPE_ID_FIELD: stripe_id}
+                )
+
+        if locked.version == obj.version:
+            _stripe_ids[key] = stripe_id
+        with _stripe_ids_lock:
+            _stripe_key_locks.pop(key, None)
+
+    setattr(obj, obj.STRIPE_ID_FIELD, stripe_id)
+    return stripe_id
+
+
 def apply_discount_to_session(order: Order, session_params: Dict[str, Any]) -> None:
     if not order.discount or not order.discount.is_active:
         return
-    
-    if order.discount.stripe_coupon_id:
-        session_params['discounts'] = [{'coupon': order.discount.stripe_coupon_id}]
-    else:
-        coupon = create_stripe_coupon(order.discount)
-        session_params['discounts'] = [{'coupon': coupon.id}]
+
+    coupon_id = get_or_create_stripe_id(order.discount, create_stripe_coupon)
+    session_params['discounts'] = [{'coupon': coupon_id}]
 
 
-def create_stripe_coupon(discount):
+def create_stripe_coupon(discount: Discount, idempotency_key: Optional[str] = None):
     if discount.discount_type == 'percentage':
-        return stripe.Coupon.create(
+        return get_stripe_client().create_coupon(
             percent_off=discount.value,
             duration='once',
-            name=discount.name
+            name=discount.name,
+            idempotency_key=idempotency_key,
         )
-    return stripe.Coupon.create(
+    return get_stripe_client().create_coupon(
         amount_off=discount.value,
         currency='usd',
         duration='once',
-        name=discount.name
+        name=discount.name,
+        idempotency_key=idempotency_key,
+    )
+
+
+def create_stripe_tax_rate(tax: Tax, idempotency_key: Optional[str] = None):
+    return get_stripe_client().create_tax_rate(
+        display_name=tax.name,
+        percentage=float(tax.percentage),
+        inclusive=False,
+        idempotency_key=idempotency_key,
     )
 
 
 def apply_tax_to_line_items(order: Order, line_items: list[Dict[str, Any]]) -> None:
     if not order.tax or not order.tax.is_active:
         return
-    
-    if order.tax.stripe_tax_rate_id:
-        tax_rate_id = order.tax.stripe_tax_rate_id
-    else:
-        tax_rate = stripe.TaxRate.create(
-            display_name=order.tax.name,
-            percentage=float(order.tax.percentage),
-            inclusive=False,
-        )
-        tax_rate_id = tax_rate.id
-    
+
+    tax_rate_id = get_or_create_stripe_id(order.tax, create_stripe_tax_rate)
+
     for item in line_items:
-        item['tax_rates'] = [tax_rate_id]
\ No newline at end of file
+        item['tax_rates'] = [tax_rate_id]
@@ -1,132 +1,194 @@
 import json
+from functools import partial, wraps
+from typing import Optional
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpRequest, HttpResponse, JsonResponse
-from django.views.decorators.http import require_POST
+from django.core.exceptions import BadRequest
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.conf import settings
 import stripe
 
-from .models import Item, Order, OrderItem
-from .utils import (
-    get_order_from_session,
-    create_order_and_save_to_session,
-    build_line_items,
-    apply_discount_to_session,
-    apply_tax_to_line_items
+from . import catalog, jobs, page_cache, stripe_async
+from .cart import CartBusy, SessionCart
+from .checkout_sessions import (
+    CLOSED_EVENT_TYPES, CheckoutSessionBusy, checkout_fingerprint, forget_checkout_session,
+    get_or_create_checkout_session,
 )
+from .models import Item, Order, OrderPricing
+from .stripe_client import get_stripe_client
+from .utils import build_item_line_items, build_order_session_params
+from .webhooks import record_stripe_event
 
 
+def item_etag(request: HttpRequest, item_id: int) -> Optional[str]:
+    item = page_cache.get_item(item_id)
+    if item is None:
+        return None
+    return f"item-{item.id}-{item.updated_at.timestamp()}-v{settings.ITEM_CACHE_VERSION}-{page_cache.page_version()}"
+
+
+def item_last_modified(request: HttpRequest, item_id: int):
+    item = page_cache.get_item(item_id)
+    # A deploy that changed the template or assets counts as a modification too.
+    return max(item.updated_at, page_cache.page_modified_at()) if item else None
+
+
+def request_cart(request: HttpRequest) -> SessionCart:
+    """The request's cart, shared by the conditional-GET check and the view."""
+    if not hasattr(request, "_cart"):
+        request._cart = SessionCart(request.session)
+    return request._cart
+
+
+def cart_etag(request: HttpRequest) -> str:
+    return request_cart(request).etag()
+
+
+def changes_cart(view):
+    """Answer 409 when another request of the session holds the cart lock for too long."""
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        try:
+            return view(request, *args, **kwargs)
+        except CartBusy as e:
+            return JsonResponse({"error": str(e)}, status=409)
+    return wrapper
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=item_etag, last_modified_func=item_last_modified)
 def item_page(request: HttpRequest, item_id: int) -> HttpResponse:
-    item = get_object_or_404(Item, id=item_id)
-    return render(request, 'items/item.html', {
-        "item": item,
-        "stripe_pk": settings.STRIPE_PUBLISHABLE_KEY,
-    })
+    body = page_cache.get_item_page(item_id)
+    if body is None:
+        raise Http404("No Item matches the given query.")
+    return HttpResponse(body)
 
 
-@require_POST
-def buy_item(request: HttpRequest, item_id: int) -> JsonResponse:
-    item = get_object_or_404(Item, id=item_id)
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+@staff_member_required
+def item_cache_stats(request: HttpRequest) -> JsonResponse:
+    return JsonResponse(page_cache.stats())
 
+
+def _catalog_page(request: HttpRequest) -> catalog.CatalogPage:
     try:
-        session = stripe.checkout.Session.create(
-            mode='payment',
-            line_items=[{
-                'price_data': {
-                    'currency': 'usd',
-                    'unit_amount': item.price,
-                    'product_data': {
-                        'name': item.name,
-                        'description': item.description,
-                    },
-                },
-                'quantity': 1,
-            }],
-            success_url=request.build_absolute_uri('/success.html'),
-            cancel_url=request.build_absolute_uri('/cancel.html'),
+        limit = int(request.GET.get("limit", catalog.DEFAULT_LIMIT))
+        return catalog.catalog_page(
+            sort=request.GET.get("sort", "price"),
+            cursor=request.GET.get("cursor") or None,
+            query=request.GET.get("q", "").strip(),
+            limit=limit,
         )
-        return JsonResponse({"id": session.id})
-    except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+    except ValueError as e:
+        raise BadRequest(str(e)) from e
+
+
+def catalog_page(request: HttpRequest) -> HttpResponse:
+    page = _catalog_page(request)
+    next_query = None
+    if page.next_cursor:
+        params = request.GET.copy()
+        params["cursor"] = page.next_cursor
+        next_query = params.urlencode()
+    return render(request, "items/catalog.html", {
+        "page": page,
+        "q": request.GET.get("q", ""),
+        "sort": request.GET.get("sort", "price"),
+        "sorts": catalog.SORTS,
+        "next_query": next_query,
+    })
+
+
+def catalog_json(request: HttpRequest) -> JsonResponse:
+    page = _catalog_page(request)
+    return JsonResponse({
+        "items": [
+            {"id": item.id, "name": item.name, "description": item.description, "price": item.price}
+            for item in page.items
+        ],
+        "next_cursor": page.next_cursor,
+    })
+
 
 @require_POST
-def buy_order(request: HttpRequest, order_id: int) -> JsonResponse:
-    order = get_object_or_404(Order, id=order_id)
-    
-    if not order.order_items.exists():
-        return JsonResponse({"error": "Cart is empty"}, status=400)
-    
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    line_items = build_line_items(order)
-    
+def buy_item(request: HttpRequest, item_id: int) -> JsonResponse:
+    # Charged at the current price, never a cached copy.
+    item = get_object_or_404(Item, id=item_id)
     session_params = {
-        'payment_method_types': ['card'],
-        'line_items': line_items,
         'mode': 'payment',
+        'line_items': build_item_line_items(item),
         'success_url': request.build_absolute_uri('/success.html'),
         'cancel_url': request.build_absolute_uri('/cancel.html'),
-        'metadata': {"order_id": str(order.id)},
     }
-    
-    apply_discount_to_session(order, session_params)
-    apply_tax_to_line_items(order, line_items)
-    
+
     try:
-        session = stripe.checkout.Session.create(**session_params)
-        return JsonResponse({"id": session.id})
+        create = partial(get_stripe_client().create_checkout_session, **session_params)
+        if not request.session.session_key:
+            return JsonResponse({"id": create().id})
+        fingerprint = checkout_fingerprint(f"session:{request.session.session_key}", session_params)
+        return JsonResponse({"id": get_or_create_checkout_session(fingerprint, create)})
+    except CheckoutSessionBusy as e:
+        return JsonResponse({"error": str(e)}, status=503)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
-
 @require_POST
+@changes_cart
 def add_to_cart(request: HttpRequest, item_id: int) -> JsonResponse:
-    item = get_object_or_404(Item, id=item_id)
-    order = get_order_from_session(request) or create_order_and_save_to_session(request)
-    order_item, created = OrderItem.objects.get_or_create(order=order, item=item)
-
-    if not created:
-        return JsonResponse({
-            "ok": False,
-            "already_in_cart": True,
-            "item_name": item.name,
-        })
+    item = page_cache.get_item(item_id)
+    if item is None:
+        raise Http404("No Item matches the given query.")
+    try:
+        data = json.loads(request.body.decode() or "{}")
+        quantity = int(data.get("quantity", 1))
+    except (json.JSONDecodeError, AttributeError, ValueError):
+        quantity = 1
 
+    quantity = SessionCart(request.session).add(item.id, max(quantity, 1))
     return JsonResponse({
         "ok": True,
-        "order_id": order.id,
         "item_id": item.id,
         "item_name": item.name,
+        "quantity": quantity,
     })
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=cart_etag)
 def cart_page(request: HttpRequest) -> HttpResponse:
-    order = get_order_from_session(request)
+    cart = request_cart(request)
     
     context = {
-        "order": order,
-        "order_items": order.order_items.select_related("item").all() if order else [],
-        "stripe_pk": settings.STRIPE_PUBLISHABLE_KEY if order else None,
+        "order": cart.as_order() if cart else None,
+        "order_items": cart.lines if cart else [],
+        "stripe_pk": settings.STRIPE_PUBLISHABLE_KEY if cart else None,
     }
     
     return render(request, "items/order.html", context)
 
 
 @require_POST
-def change_quantity(request: HttpRequest, order_id: int, item_id: int) -> JsonResponse | HttpResponse:
-    order = get_object_or_404(Order, id=order_id)
-    order_item = get_object_or_404(OrderItem, order=order, item_id=item_id)
+@changes_cart
+def change_quantity(request: HttpRequest, item_id: int) -> JsonResponse | HttpResponse:
+    cart = SessionCart(request.session)
+    if item_id not in cart:
+        raise Http404("Item is not in the cart.")
 
     try:
         data = json.loads(request.body.decode() or "{}")
-        quantity = int(data.get("quantity", order_item.quantity))
-    except (json.JSONDecodeError, ValueError):
-        quantity = int(request.POST.get("quantity", order_item.quantity))
-
-    if quantity <= 0:
-        order_item.delete()
-    else:
-        order_item.quantity = quantity
-        order_item.save()
+    except json.JSONDecodeError:
+        data = request.POST
+    try:
+        if "delta" in data:
+            quantity = cart.increment(item_id, int(data["delta"]))
+        else:
+            quantity = int(data.get("quantity", cart.quantity(item_id)))
+            cart.set(item_id, quantity)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid quantity"}, status=400)
 
     if request.headers.get("accept", "").find("application/json") != -1:
         return JsonResponse({"ok": True, "quantity": quantity})
@@ -135,10 +197,11 @@ def change_quantity(request: HttpRequest, order_id: int, item_id: int) -> JsonRe
 
 
 @require_POST
-def delete_item(request: HttpRequest, order_id: int, item_id: int) -> JsonResponse | HttpResponse:
-    order = get_object_or_404(Order, id=order_id)
-    order_item = get_object_or_404(OrderItem, order=order, item_id=item_id)
-    order_item.delete()
+@changes_cart
+def delete_item(request: HttpRequest, item_id: int) -> JsonResponse | HttpResponse:
+    cart = SessionCart(request.session)
+    if not cart.remove(item_id):
+        raise Http404("Item is not in the cart.")
 
     if request.headers.get("accept", "").find("application/json") != -1:
         return JsonResponse({"ok": True})
@@ -147,45 +210,145 @@ def delete_item(request: HttpRequest, order_id: int, item_id: int) -> JsonRespon
 
 
 @require_POST
-def buy_order(request: HttpRequest, order_id: int) -> JsonResponse:
-    order = get_object_or_404(Order, id=order_id)
+@changes_cart
+def cart_batch(request: HttpRequest) -> JsonResponse:
+    """Apply a list of cart operations in one request and return the resulting cart."""
+    try:
+        operations = json.loads(request.body.decode() or "{}").get("operations")
+    except (json.JSONDecodeError, AttributeError):
+        operations = None
+    if not isinstance(operations, list):
+        return JsonResponse({"error": "Expected {\"operations\": [...]}"}, status=400)
+
+    cart = SessionCart(request.session)
+    try:
+        cart.apply(operations)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    order = cart.as_order()
+    return JsonResponse({
+        "ok": True,
+        "lines": [
+            {"item_id": line.item.id, "name": line.item.name, "quantity": line.quantity, "line_total": line.line_total}
+            for line in cart.lines
+        ],
+        "subtotal": order.subtotal,
+        "discount_amount": order.discount_amount,
+        "tax_amount": order.tax_amount,
+        "total": order.total,
+    })
+
+
+@require_POST
+def buy_order(request: HttpRequest, order_id: Optional[int] = None) -> JsonResponse:
+    if order_id is None:
+        cart = SessionCart(request.session)
+        if not cart.lines:
+            return JsonResponse({"error": "Cart is empty"}, status=400)
+        order = cart.to_order()
+    else:
+        order = get_object_or_404(Order.objects.select_related("discount", "tax"), id=order_id)
     
-    if not order.order_items.exists():
+    if order.is_paid:
+        return JsonResponse({"error": "Order is already paid"}, status=400)
+    if not order.pricing.lines:
         return JsonResponse({"error": "Cart is empty"}, status=400)
     
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    line_items = build_line_items(order)
-    
-    session_params = {
-        'payment_method_types': ['card'],
-        'line_items': line_items,
-        'mode': 'payment',
-        'success_url': request.build_absolute_uri(f'/success.html?order_id={order.id}'),
-        'cancel_url': request.build_absolute_uri('/cancel.html'),
-    }
-    
-    apply_discount_to_session(order, session_params)
-    apply_tax_to_line_items(order, line_items)
+    session_params = build_order_session_params(
+        order,
+        success_url=request.build_absolute_uri(f'/success.html?order_id={order.id}'),
+        cancel_url=request.build_absolute_uri('/cancel.html'),
+    )
     
     try:
-        session = stripe.checkout.Session.create(**session_params)
+        fingerprint = checkout_fingerprint(f"order:{order.id}", session_params)
+        session_id = get_or_create_checkout_session(
+            fingerprint, partial(get_stripe_client().create_checkout_session, **session_params)
+        )
+        return JsonResponse({"id": session_id})
+    except CheckoutSessionBusy as e:
+        return JsonResponse({"error": str(e)}, status=503)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@require_POST
+async def buy_item_async(request: HttpRequest, item_id: int) -> JsonResponse:
+    try:
+        item = await Item.objects.aget(id=item_id)
+    except Item.DoesNotExist:
+        raise Http404("No Item matches the given query.")
+
+    try:
+        session = await stripe_async.create_checkout_session(
+            mode='payment',
+            line_items=build_item_line_items(item),
+            success_url=request.build_absolute_uri('/success.html'),
+            cancel_url=request.build_absolute_uri('/cancel.html'),
+        )
+        return JsonResponse({"id": session.id})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@require_POST
+async def buy_order_async(request: HttpRequest, order_id: int) -> JsonResponse:
+    try:
+        order = await Order.objects.select_related("discount", "tax").aget(id=order_id)
+    except Order.DoesNotExist:
+        raise Http404("No Order matches the given query.")
+
+    if order.is_paid:
+        return JsonResponse({"error": "Order is already paid"}, status=400)
+    lines = [oi async for oi in order.order_items.select_related("item")]
+    if not lines:
+        return JsonResponse({"error": "Cart is empty"}, status=400)
+    order.pricing = OrderPricing.from_lines(order, lines)
+
+    # Coupon and tax-rate ids may still need a locked first-time write.
+    session_params = await sync_to_async(build_order_session_params)(
+        order,
+        success_url=request.build_absolute_uri(f'/success.html?order_id={order.id}'),
+        cancel_url=request.build_absolute_uri('/cancel.html'),
+    )
+
+    try:
+        session = await stripe_async.create_checkout_session(**session_params)
         return JsonResponse({"id": session.id})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
 def success_page(request):
-    order_id = request.GET.get('order_id')
-    if order_id:
-        try:
-            order = Order.objects.get(id=order_id)
-            order.is_paid = True
-            order.save()
-        except Order.DoesNotExist:
-            pass
-    
+    # Orders are marked paid by the Stripe webhook, not by visiting this page;
+    # it only closes the session's checkout, so later cart requests need no lookup.
+    try:
+        SessionCart(request.session).finish_checkout(int(request.GET["order_id"]))
+    except (KeyError, ValueError):
+        pass
     return render(request, 'success.html')
 
 
+@csrf_exempt
+@require_POST
+def stripe_webhook(request: HttpRequest) -> HttpResponse:
+    try:
+        event = stripe.Webhook.construct_event(
+            request.body,
+            request.headers.get("Stripe-Signature", ""),
+            settings.STRIPE_WEBHOOK_SECRET,
+        )
+    except (ValueError, stripe.error.SignatureVerificationError):
+        return HttpResponse(status=400)
+
+    payload = json.loads(request.body)
+    record_stripe_event(event.id, event.type, payload)
+    if event.type in CLOSED_EVENT_TYPES and payload["data"]["object"].get("id"):
+        forget_checkout_session(payload["data"]["object"]["id"])
+    jobs.enqueue_unique("stripe.process_events")
+    return HttpResponse(status=200)
+
+
 def cancel_page(request):
     return render(request, 'cancel.html')
\ No newline at end of file
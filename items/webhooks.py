@@ -0,0 +1,56 @@
+from typing import Any, Dict, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, StripeEvent
+
+PAID_EVENT_TYPES = {
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+}
+
+
+def record_stripe_event(event_id: str, event_type: str, payload: Dict[str, Any]) -> None:
+    """Append the raw event; a replayed event id is silently ignored."""
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(event_id=event_id, type=event_type, payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def paid_order_id(event: StripeEvent) -> Optional[int]:
+    if event.type not in PAID_EVENT_TYPES:
+        return None
+    session = event.payload.get("data", {}).get("object", {})
+    if session.get("payment_status") != "paid":
+        return None
+    order_id = (session.get("metadata") or {}).get("order_id") or session.get("client_reference_id")
+    try:
+        return int(order_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def process_stripe_events(batch_size: int = 500) -> int:
+    """
+    Apply one batch of unprocessed events and return how many were consumed.
+
+    Paid orders in the batch are flipped with a single UPDATE in the same
+    transaction that marks the events processed, so re-running is a no-op.
+    """
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        order_ids = {order_id for order_id in map(paid_order_id, events) if order_id}
+        if order_ids:
+            Order.objects.filter(id__in=order_ids, is_paid=False).update(is_paid=True, updated_at=timezone.now())
+
+        StripeEvent.objects.filter(id__in=[event.id for event in events]).update(processed_at=timezone.now())
+    return len(events)
@@ -0,0 +1,55 @@
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from .pool import get_pool
+
+POOL_DEFAULTS = {
+    "size": 5,
+    "max_overflow": 10,
+    "timeout": 30.0,
+    "max_lifetime": 1800.0,
+    "health_check_after": 30.0,
+}
+IDLE = 0  # TRANSACTION_STATUS_IDLE in both psycopg2 and psycopg
+
+
+def ping(connection) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    return True
+
+
+def reset(connection) -> bool:
+    if connection.closed:
+        return False
+    if connection.info.transaction_status != IDLE:
+        connection.rollback()
+    return connection.info.transaction_status == IDLE
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """
+    PostgreSQL backend that borrows connections from a process-wide pool.
+
+    Django's ``close()`` returns the connection to the pool instead of
+    closing it, so with ``CONN_MAX_AGE = 0`` every request, WSGI or ASGI,
+    checks a warm connection out on its first query and back in when it
+    finishes. Pool settings come from the ``POOL`` key of the database entry.
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, **{**POOL_DEFAULTS, **self.settings_dict.get("POOL", {}), "check": ping, "reset": reset})
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # Normally set while connecting; a reused connection skips that.
+        self.isolation_level = IsolationLevel(
+            self.settings_dict["OPTIONS"].get("isolation_level", IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
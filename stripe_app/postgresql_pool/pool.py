@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    """No connection became free within the pool's ``timeout``."""
+
+
+@dataclass
+class _Idle:
+    connection: Any
+    created_at: float
+    returned_at: float
+
+
+def _close(connection) -> None:
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections, shared by every thread of a process.
+
+    Keeps up to ``size`` idle connections and opens up to ``max_overflow``
+    more under load, which are closed as soon as they are returned. A
+    connection older than ``max_lifetime`` seconds is closed instead of being
+    reused, and one that sat idle for over ``health_check_after`` seconds is
+    passed to ``check`` before being handed out. ``reset`` runs on return and
+    must leave the connection outside any transaction, returning ``False``
+    if it could not. After a fork the child starts with an empty pool and
+    leaves the parent's sockets alone.
+    """
+
+    def __init__(
+        self,
+        size: int = 5,
+        max_overflow: int = 10,
+        timeout: float = 30.0,
+        max_lifetime: Optional[float] = 1800.0,
+        health_check_after: Optional[float] = 30.0,
+        check: Optional[Callable[[Any], bool]] = None,
+        reset: Optional[Callable[[Any], bool]] = None,
+    ):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.check = check
+        self.reset = reset
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+        self._idle: deque[_Idle] = deque()
+        self._created_at: dict[int, float] = {}
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            self._init_state()
+
+    @property
+    def open_connections(self) -> int:
+        return len(self._idle) + len(self._created_at)
+
+    @property
+    def idle_connections(self) -> int:
+        return len(self._idle)
+
+    def acquire(self, connect: Callable[[], Any]):
+        """Hand out an idle connection, or open one with ``connect()`` if there is room."""
+        self._check_pid()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                while not self._idle and self.open_connections >= self.size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No database connection free after {self.timeout}s "
+                            f"({self.size} pooled + {self.max_overflow} overflow in use)."
+                        )
+                    self._lock.wait(remaining)
+                if self._idle:
+                    idle = self._idle.pop()
+                    self._created_at[id(idle.connection)] = idle.created_at
+                else:
+                    idle = None
+                    # Hold the slot while connecting outside the lock.
+                    reservation = object()
+                    self._created_at[id(reservation)] = time.monotonic()
+
+            if idle is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._forget(id(reservation))
+                    raise
+                with self._lock:
+                    self._created_at[id(connection)] = self._created_at.pop(id(reservation))
+                    self.opened += 1
+                return connection
+
+            if self._usable(idle):
+                with self._lock:
+                    self.reused += 1
+                return idle.connection
+            self._discard(idle.connection)
+
+    def release(self, connection) -> None:
+        """Take ``connection`` back, closing it if it is broken, expired or overflow."""
+        self._check_pid()
+        with self._lock:
+            created_at = self._created_at.get(id(connection))
+            keep = created_at is not None and len(self._idle) < self.size and not self._expired(created_at)
+        if created_at is None:
+            # Checked out before a fork, or never ours.
+            _close(connection)
+            return
+        if keep and self.reset is not None:
+            try:
+                keep = self.reset(connection)
+            except Exception:
+                keep = False
+        if not keep:
+            self._discard(connection)
+            return
+        with self._lock:
+            del self._created_at[id(connection)]
+            self._idle.append(_Idle(connection, created_at, time.monotonic()))
+            self._lock.notify()
+
+    def close(self) -> None:
+        """Close every idle connection; ones in use are closed when returned."""
+        self._check_pid()
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+            self._lock.notify_all()
+        for entry in idle:
+            _close(entry.connection)
+
+    def _usable(self, idle: _Idle) -> bool:
+        if self._expired(idle.created_at) or getattr(idle.connection, "closed", False):
+            return False
+        if (
+            self.check is None
+            or self.health_check_after is None
+            or time.monotonic() - idle.returned_at < self.health_check_after
+        ):
+            return True
+        try:
+            return self.check(idle.connection)
+        except Exception:
+            return False
+
+    def _expired(self, created_at: float) -> bool:
+        return self.max_lifetime is not None and time.monotonic() - created_at >= self.max_lifetime
+
+    def _discard(self, connection) -> None:
+        _close(connection)
+        self._forget(id(connection))
+        with self._lock:
+            self.discarded += 1
+
+    def _forget(self, key: int) -> None:
+        with self._lock:
+            self._created_at.pop(key, None)
+            self._lock.notify()
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, **options) -> ConnectionPool:
+    """The process-wide pool for database ``alias``, created with ``options`` on first use."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(**options)
+    return pool
+
+
+def close_pools() -> None:
+    """Close the idle connections of every pool, e.g. in a server master before forking."""
+    for pool in list(_pools.values()):
+        pool.close()
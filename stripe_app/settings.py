@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -19,8 +20,15 @@ INSTALLED_APPS = [
     'items',
 ]
 
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Static files are answered here, ahead of metrics, sessions and auth.
+    'items.staticfiles.StaticFilesMiddleware',
+    *(['items.metrics.MetricsMiddleware'] if METRICS_ENABLED else []),
+    'items.db_router.ReplicaRouterMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -33,7 +41,7 @@ ROOT_URLCONF = 'stripe_app.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'items.metrics.TimedDjangoTemplates' if METRICS_ENABLED else 'django.template.backends.django.DjangoTemplates',
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -55,9 +63,72 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
         'PORT': os.getenv('DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+    }
+}
+
+# Client-side pool for PostgreSQL (stripe_app.postgresql_pool). Connections
+# go back to the pool at the end of each request, so persistent per-thread
+# connections are switched off. They are also off under ASGI, whose request
+# threads come and go and would leave their connections behind.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+if DB_POOL:
+    DATABASES['default']['ENGINE'] = 'stripe_app.postgresql_pool'
+    DATABASES['default']['POOL'] = {
+        'size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        'health_check_after': float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30')),
+    }
+if DB_POOL or os.getenv('SERVER_INTERFACE') == 'asgi':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# Optional read replica: any DB_REPLICA_* variable adds it, the rest are
+# taken from the primary. Safe requests read from it (items.db_router);
+# clients that wrote within DB_REPLICA_STICKY_SECONDS stay on the primary.
+if any(os.getenv(f'DB_REPLICA_{key}') for key in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD')):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        **{key: os.getenv(f'DB_REPLICA_{key}') for key in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD') if os.getenv(f'DB_REPLICA_{key}')},
+        'TEST': {'MIRROR': 'default'},
     }
+DATABASE_ROUTERS = ['items.db_router.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', '5'))
+
+# Both caches are file-based by default, so every worker of a host shares
+# them without an external service: the default one holds item pages, cart
+# and checkout locks and checkout session ids, and its add() is atomic across
+# processes (items.cache). Sessions get a cache of their own. Point
+# CACHE_BACKEND/LOCATION and SESSION_CACHE_BACKEND/LOCATION at Redis or
+# memcached to share them between hosts.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'items.cache.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'stripe_app_cache')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))},
+    },
+    'sessions': {
+        'BACKEND': os.getenv('SESSION_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('SESSION_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'stripe_app_sessions')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('SESSION_CACHE_MAX_ENTRIES', '10000'))},
+    },
 }
 
+# cached_db: read from the sessions cache, written through to the table.
+# signed_cookies: no server-side storage at all. db: Django's default.
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cached_db')
+SESSION_ENGINE = {
+    'cached_db': 'items.sessions.cached_db',
+    'signed_cookies': 'items.sessions.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}[SESSION_BACKEND]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Gives the file-based caches a temporary directory per test run.
+TEST_RUNNER = 'stripe_app.test_runner.TestRunner'
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -71,8 +142,42 @@ USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = 'static/'
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+# Cache lifetime of static files without a content hash in their name.
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '60'))
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'items.staticfiles.CompressedManifestStaticFilesStorage'},
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
-STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
\ No newline at end of file
+STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', 'https://api.stripe.com')
+STRIPE_CONNECT_TIMEOUT = float(os.getenv('STRIPE_CONNECT_TIMEOUT', '5'))
+STRIPE_READ_TIMEOUT = float(os.getenv('STRIPE_READ_TIMEOUT', '30'))
+STRIPE_MAX_RETRIES = int(os.getenv('STRIPE_MAX_RETRIES', '2'))
+STRIPE_HTTP_POOL_SIZE = int(os.getenv('STRIPE_HTTP_POOL_SIZE', '10'))
+STRIPE_ASYNC_MAX_CONNECTIONS = int(os.getenv('STRIPE_ASYNC_MAX_CONNECTIONS', '100'))
+
+# Route all Stripe calls to a local stand-in (items.stripe_standin) for load tests.
+STRIPE_FAKE_BACKEND = os.getenv('STRIPE_FAKE_BACKEND', 'False') == 'True'
+STRIPE_FAKE_LATENCY = float(os.getenv('STRIPE_FAKE_LATENCY', '0.2'))
+STRIPE_FAKE_ERROR_RATE = float(os.getenv('STRIPE_FAKE_ERROR_RATE', '0'))
+
+CHECKOUT_SESSION_CACHE_TIMEOUT = int(os.getenv('CHECKOUT_SESSION_CACHE_TIMEOUT', '3600'))
+CHECKOUT_SESSION_EXPIRY_MARGIN = int(os.getenv('CHECKOUT_SESSION_EXPIRY_MARGIN', '300'))
+CHECKOUT_SESSION_LOCK_TIMEOUT = int(os.getenv('CHECKOUT_SESSION_LOCK_TIMEOUT', '10'))
+
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', '300'))
+JOB_RETRY_BASE_DELAY = float(os.getenv('JOB_RETRY_BASE_DELAY', '5'))
+JOB_RETRY_MAX_DELAY = float(os.getenv('JOB_RETRY_MAX_DELAY', '600'))
+
+CART_LOCK_TIMEOUT = int(os.getenv('CART_LOCK_TIMEOUT', '5'))
+
+ITEM_CACHE_TIMEOUT = int(os.getenv('ITEM_CACHE_TIMEOUT', '86400'))
+ITEM_CACHE_VERSION = int(os.getenv('ITEM_CACHE_VERSION', '1'))
\ No newline at end of file
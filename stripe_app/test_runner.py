@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Run the tests with file-based caches and SQLite databases in a directory of their own.
+
+    Tests clear the caches freely; pointed at the configured locations they
+    would wipe a running server's sessions and leave entries behind for the
+    next run. The SQLite test databases are files rather than Django's
+    shared in-memory default, whose table locks fail concurrent writers at
+    once instead of letting them wait, as the threaded tests need.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.tmp_dir = tempfile.mkdtemp(prefix="stripe_app_test_")
+        caches = {
+            alias: {**config, "LOCATION": os.path.join(self.tmp_dir, alias)}
+            if issubclass(import_string(config["BACKEND"]), FileBasedCache)
+            else config
+            for alias, config in settings.CACHES.items()
+        }
+        self.cache_settings = override_settings(CACHES=caches)
+        self.cache_settings.enable()
+
+    def setup_databases(self, **kwargs):
+        for alias, settings_dict in connections.settings.items():
+            if settings_dict["ENGINE"] == "django.db.backends.sqlite3" and not settings_dict["TEST"]["NAME"]:
+                settings_dict["TEST"]["NAME"] = os.path.join(self.tmp_dir, f"{alias}.sqlite3")
+        return super().setup_databases(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
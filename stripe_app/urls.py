@@ -2,9 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 
+from items.metrics import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('items.urls')),
     path('success.html', TemplateView.as_view(template_name='success.html'), name='success'),
     path('cancel.html', TemplateView.as_view(template_name='cancel.html'), name='cancel'),